@@ -1,3 +1,14 @@
 from django.contrib import admin
+from .models import Message, CompanionCircle
 
-# Register your models here.
+@admin.register(Message)
+class MessageAdmin(admin.ModelAdmin):
+    list_display = ('room', 'sender', 'body', 'created_at')
+    list_filter = ('created_at',)
+    search_fields = ('room', 'body')
+
+@admin.register(CompanionCircle)
+class CompanionCircleAdmin(admin.ModelAdmin):
+    list_display = ('name', 'owner', 'created_at')
+    search_fields = ('name', 'owner__email')
+    filter_horizontal = ('members',)
@@ -1,10 +1,19 @@
+import asyncio
 import json
+import time
 # --- 1. Use the ASYNC consumer ---
 from channels.generic.websocket import AsyncWebsocketConsumer
 # --- 2. Import the database wrapper ---
 from channels.db import database_sync_to_async
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from .history import load_history, load_since
+from .message_store import message_buffer
+from .models import UnreadCounter
+from .presence import PresenceRoster
+from .rate_limit import TokenBucket, acquire_user_bucket, release_user_bucket
 
 User = get_user_model()
 
@@ -13,65 +22,236 @@ class ChatConsumer(AsyncWebsocketConsumer):
     
     # --- 4. This is now ASYNC ---
     async def connect(self):
-        # Get user IDs from the URL
-        self.user_1_id = int(self.scope['url_route']['kwargs']['user_1_id'])
-        self.user_2_id = int(self.scope['url_route']['kwargs']['user_2_id'])
-        
         # --- 5. THE REAL FIX ---
-        # We wrap our database validation in a helper
-        is_allowed = await self.check_user_allowed()
-        
-        if not is_allowed:
+        # Work out the room and check the user may join it, once.
+        # Nothing per message needs the database after this.
+        room_name = await self.resolve_room()
+
+        if room_name is None:
             await self.close()
             return
         # --- END OF FIX ---
 
-        # Sort the IDs to create a consistent room name
-        if self.user_1_id < self.user_2_id:
-            self.room_name = f'chat_{self.user_1_id}_{self.user_2_id}'
-        else:
-            self.room_name = f'chat_{self.user_2_id}_{self.user_1_id}'
-            
+        self.room_name = room_name
         self.room_group_name = f'group_{self.room_name}'
 
+        # Flood protection: one bucket for this connection, and one shared
+        # by all of this user's connections (so more tabs != more messages)
+        self.max_frame_bytes = getattr(settings, 'CHAT_MAX_FRAME_BYTES', 4096)
+        self.max_message_length = getattr(settings, 'CHAT_MAX_MESSAGE_LENGTH', 2000)
+        self.max_violations = getattr(settings, 'CHAT_MAX_VIOLATIONS', 20)
+        self.violation_window = getattr(settings, 'CHAT_VIOLATION_WINDOW', 60)
+        self.violations = 0
+        self.last_violation = 0.0
+        self.connection_bucket = TokenBucket(
+            getattr(settings, 'CHAT_CONNECTION_RATE', 5),
+            getattr(settings, 'CHAT_CONNECTION_BURST', 20),
+        )
+        self.user_bucket = acquire_user_bucket(
+            self.user_id,
+            getattr(settings, 'CHAT_USER_RATE', 5),
+            getattr(settings, 'CHAT_USER_BURST', 20),
+        )
+
         # Join room group (this is already async, no wrapper needed)
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
+        # Everything sent from now on reaches us live; anything older
+        # comes from history (see send_history and catch_up)
+        self.joined_at = timezone.now()
         
         # Accept the connection
         await self.accept()
 
-    # --- 6. ADD THIS HELPER FUNCTION ---
-    # This function safely runs our sync DB query in an async context
+        # Presence: everyone connected to this room. We start with just
+        # ourselves and learn about the others from their replies to our
+        # "join"; their heartbeats keep them in the roster after that.
+        self.present = PresenceRoster(getattr(settings, 'CHAT_PRESENCE_TTL', 90))
+        self.present.add(self.channel_name, self.user_id, self.user_email, permanent=True)
+        self.typing = False
+        self.last_typing_sent = 0.0
+        await self.channel_layer.group_send(self.room_group_name, {
+            'type': 'presence_join',
+            'channel': self.channel_name,
+            'sender_id': self.user_id,
+            'sender_email': self.user_email,
+        })
+
+        # Send the latest page of history. Flush this worker's unsaved
+        # messages first (and wait for writes already under way) so the
+        # page includes them.
+        await message_buffer.flush()
+        await self.mark_read()
+        page = await self.send_history()
+        await self.send_presence()
+        self.catch_up_task = asyncio.create_task(self.catch_up(page[-1] if page else None))
+        self.heartbeat_task = asyncio.create_task(self.heartbeat())
+
     @database_sync_to_async
-    def check_user_allowed(self):
-        # self.scope['user'] is a sync database call
-        # By putting it here, we are telling Django
-        # to run it safely in a separate thread.
-        current_user_id = self.scope['user'].id
-        if current_user_id not in [self.user_1_id, self.user_2_id]:
+    def mark_read(self):
+        UnreadCounter.objects.filter(user_id=self.user_id, room=self.room_name, count__gt=0).update(count=0, offline_count=0)
+
+    async def send_history(self, cursor=None):
+        page_size = getattr(settings, 'CHAT_HISTORY_PAGE_SIZE', 50)
+        messages, next_cursor = await database_sync_to_async(load_history)(
+            self.room_name, cursor=cursor, page_size=page_size, until=self.joined_at
+        )
+        await self.send(text_data=json.dumps({
+            'type': 'history',
+            'older': cursor is not None,
+            'messages': messages,
+            'cursor': next_cursor,
+        }))
+        return messages
+
+    async def catch_up(self, newest):
+        """
+        A message sent just before we joined may still have been in another
+        worker's write buffer when we loaded history, so it was neither in
+        the first page nor delivered live. Once those buffers have had time
+        to flush, send whatever was saved after the newest message we had.
+        """
+        await asyncio.sleep(getattr(settings, 'CHAT_HISTORY_CATCH_UP_DELAY', 2.0))
+        messages = await database_sync_to_async(load_since)(
+            self.room_name, newest, self.joined_at,
+            limit=getattr(settings, 'CHAT_HISTORY_PAGE_SIZE', 50),
+        )
+        if messages:
+            await self.send(text_data=json.dumps({
+                'type': 'history',
+                'catch_up': True,
+                'messages': messages,
+            }))
+
+    async def resolve_room(self):
+        """
+        Returns this connection's room name, or None to refuse it.
+        A 1:1 room is just the two user IDs from the URL, sorted.
+        """
+        # Get user IDs from the URL
+        self.user_1_id = int(self.scope['url_route']['kwargs']['user_1_id'])
+        self.user_2_id = int(self.scope['url_route']['kwargs']['user_2_id'])
+
+        if not self.check_user_allowed({self.user_1_id, self.user_2_id}):
+            return None
+
+        # Sort the IDs to create a consistent room name
+        if self.user_1_id < self.user_2_id:
+            return f'chat_{self.user_1_id}_{self.user_2_id}'
+        return f'chat_{self.user_2_id}_{self.user_1_id}'
+
+    # --- 6. ADD THIS HELPER FUNCTION ---
+    # AuthMiddlewareStack has already loaded scope['user'] by the time we
+    # get here, so this is plain attribute access - no thread hop needed.
+    # We also remember who the sender is and who is in the room for the
+    # rest of the connection, so receive() never has to look them up.
+    def check_user_allowed(self, member_ids):
+        user = self.scope['user']
+        if user.id not in member_ids:
             return False
+        self.member_ids = frozenset(member_ids)
+        # Everyone else in the room: whoever of them isn't connected
+        # gets an unread message when we send one
+        self.recipient_ids = self.member_ids - {user.id}
+        self.user_id = user.id
+        self.user_email = user.email
         return True
     # --- END OF HELPER ---
 
     # --- 7. disconnect, receive, and chat_message are all ASYNC ---
     async def disconnect(self, close_code):
+        # We never joined if connect() turned this user away
+        if not hasattr(self, 'room_group_name'):
+            return
+
+        release_user_bucket(self.user_id)
+        if hasattr(self, 'catch_up_task'):
+            self.catch_up_task.cancel()
+        if hasattr(self, 'heartbeat_task'):
+            self.heartbeat_task.cancel()
+
+        await self.channel_layer.group_send(self.room_group_name, {
+            'type': 'presence_leave',
+            'channel': self.channel_name,
+        })
+
         # Leave room group (already async)
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
 
+        # Everything that arrived while we were here has been seen.
+        # Flush first so those messages are counted before we reset.
+        await message_buffer.flush()
+        await self.mark_read()
+
     # Receive message from WebSocket (already async)
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        message = text_data_json['message']
-        
-        # Get the sender's email to display
-        # We must use our helper to access the user
-        sender_email = await self.get_sender_email()
+    async def receive(self, text_data=None, bytes_data=None):
+        # Cheap checks first, before we spend time parsing anything.
+        # (len() counts characters, which is never more than the bytes.)
+        if text_data is None:
+            await self.reject('Only text frames are accepted.')
+            return
+        if len(text_data) > self.max_frame_bytes or len(text_data.encode('utf-8')) > self.max_frame_bytes:
+            await self.reject('That message is too large.')
+            return
+        if not self.connection_bucket.take():
+            await self.reject("You're sending messages too quickly. Please wait a moment.")
+            return
+        if not text_data.lstrip().startswith('{'):
+            await self.reject("Sorry, that message couldn't be read.")
+            return
+
+        try:
+            text_data_json = json.loads(text_data)
+        except ValueError:
+            text_data_json = None
+        if not isinstance(text_data_json, dict):
+            await self.reject("Sorry, that message couldn't be read.")
+            return
+
+        # "Load older" button: fetch the page before the given cursor
+        if text_data_json.get('type') == 'load_older':
+            try:
+                await self.send_history(cursor=text_data_json['cursor'])
+            except (KeyError, ValueError):
+                await self.reject('Invalid history cursor.')
+            return
+
+        if text_data_json.get('type') == 'typing':
+            await self.set_typing(bool(text_data_json.get('typing')))
+            return
+
+        message = text_data_json.get('message')
+        if not isinstance(message, str) or not message.strip():
+            await self.reject("Sorry, that message couldn't be read.")
+            return
+        if len(message) > self.max_message_length:
+            await self.reject('That message is too long.')
+            return
+        if not self.user_bucket.take():
+            await self.reject("You're sending messages too quickly. Please wait a moment.")
+            return
+
+        # Sending a message ends the typing indicator
+        self.typing = False
+
+        # Save it for history. This only queues it in memory;
+        # the buffer writes messages in batches in the background.
+        # Members with no socket open in this room never see the
+        # group_send: it counts as unread for them, and they get it in
+        # an email digest. Members reading along live have seen it.
+        # (Queued before the group_send, so its timestamp is never later
+        # than the moment anyone could receive it; see connect().)
+        offline_ids = self.recipient_ids - self.present.user_ids()
+        created_at = message_buffer.add(
+            self.room_name, self.user_id, message,
+            recipient_ids=offline_ids,
+            offline_ids=offline_ids,
+        )
 
         # Send message to room group (already async)
         await self.channel_layer.group_send(
@@ -79,15 +259,28 @@ class ChatConsumer(AsyncWebsocketConsumer):
             {
                 'type': 'chat_message',
                 'message': message,
-                'sender_email': sender_email
+                'sender_email': self.user_email,
+                'created_at': created_at.isoformat(),
             }
         )
         
-    # --- 8. ADD THIS SECOND HELPER FUNCTION ---
-    @database_sync_to_async
-    def get_sender_email(self):
-        return self.scope['user'].email
-    # --- END OF HELPER ---
+    async def reject(self, reason):
+        """
+        Tells the client why a frame was dropped; hangs up on repeat offenders.
+        Only rejections close together count: after CHAT_VIOLATION_WINDOW
+        seconds without one the count starts again, so a long-lived client
+        that now and then runs into the rate limit is never cut off.
+        """
+        now = time.monotonic()
+        if now - self.last_violation > self.violation_window:
+            self.violations = 0
+        self.last_violation = now
+        self.violations += 1
+        if self.violations > self.max_violations:
+            print(f"!!! Closing chat connection for user {self.user_id}: too many rejected frames !!!")
+            await self.close(code=4008)
+            return
+        await self.send(text_data=json.dumps({'type': 'error', 'message': reason}))
 
     # Receive message from room group (already async)
     async def chat_message(self, event):
@@ -96,6 +289,119 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         # Send message to WebSocket (already async)
         await self.send(text_data=json.dumps({
+            'type': 'chat_message',
             'message': message,
-            'sender_email': sender_email
-        }))
\ No newline at end of file
+            'sender_email': sender_email,
+            'created_at': event.get('created_at'),
+        }))
+
+    # --- Presence and typing ---
+    async def send_presence(self):
+        await self.send(text_data=json.dumps({
+            'type': 'presence',
+            'online': self.present.emails(),
+        }))
+
+    async def presence_join(self, event):
+        if event['channel'] == self.channel_name:
+            return
+        self.present.add(event['channel'], event['sender_id'], event['sender_email'])
+        # Tell the newcomer we're here (just them, not the whole room)
+        await self.channel_layer.send(event['channel'], {
+            'type': 'presence_here',
+            'channel': self.channel_name,
+            'sender_id': self.user_id,
+            'sender_email': self.user_email,
+        })
+        await self.send_presence()
+
+    async def presence_here(self, event):
+        self.present.add(event['channel'], event['sender_id'], event['sender_email'])
+        await self.send_presence()
+
+    async def presence_leave(self, event):
+        if self.present.remove(event['channel']):
+            await self.send_presence()
+
+    async def heartbeat(self):
+        """
+        Every CHAT_PRESENCE_HEARTBEAT seconds, tell the room we're still
+        here. If this worker dies, the heartbeats stop and everyone else
+        drops us once CHAT_PRESENCE_TTL runs out; a socket that dies quietly
+        is noticed by the server's websocket pings and goes via disconnect().
+        """
+        interval = getattr(settings, 'CHAT_PRESENCE_HEARTBEAT', 30)
+        while True:
+            await asyncio.sleep(interval)
+            await self.channel_layer.group_send(self.room_group_name, {
+                'type': 'presence_heartbeat',
+                'channel': self.channel_name,
+                'sender_id': self.user_id,
+                'sender_email': self.user_email,
+            })
+            # Nobody else may be left to send a heartbeat that would
+            # trigger the pruning below, so check for expired entries here too
+            if self.present.prune():
+                await self.send_presence()
+
+    async def presence_heartbeat(self, event):
+        if event['channel'] == self.channel_name:
+            return
+        # Only a change is worth a frame: someone we had expired (or
+        # never heard from) is back, or someone else has gone quiet
+        new = self.present.add(event['channel'], event['sender_id'], event['sender_email'])
+        if self.present.prune() or new:
+            await self.send_presence()
+
+    async def set_typing(self, typing):
+        """
+        The browser reports typing on every keystroke. We only pass on a
+        change of state, plus a "still typing" refresh at most once every
+        CHAT_TYPING_INTERVAL seconds, so the room sees a few frames per
+        second at most however fast someone types.
+        """
+        now = time.monotonic()
+        interval = getattr(settings, 'CHAT_TYPING_INTERVAL', 1.0)
+        if typing == self.typing and (not typing or now - self.last_typing_sent < interval):
+            return
+
+        self.typing = typing
+        self.last_typing_sent = now
+        await self.channel_layer.group_send(self.room_group_name, {
+            'type': 'typing_update',
+            'channel': self.channel_name,
+            'sender_email': self.user_email,
+            'typing': typing,
+        })
+
+    async def typing_update(self, event):
+        if event['channel'] == self.channel_name:
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'typing',
+            'sender_email': event['sender_email'],
+            'typing': event['typing'],
+        }))
+
+
+class CircleChatConsumer(ChatConsumer):
+    """
+    Group chat for a CompanionCircle. Everything but the room lookup is
+    inherited: each message is one group_send to 'group_circle_<id>',
+    however many members are connected.
+
+    The member list is loaded once at connect. Someone removed from the
+    circle keeps their open connection until they next reconnect.
+    """
+
+    async def resolve_room(self):
+        circle_id = int(self.scope['url_route']['kwargs']['circle_id'])
+        member_ids = await self.get_member_ids(circle_id)
+
+        if not member_ids or not self.check_user_allowed(member_ids):
+            return None
+        return f'circle_{circle_id}'
+
+    @database_sync_to_async
+    def get_member_ids(self, circle_id):
+        return set(User.objects.filter(companion_circles=circle_id).values_list('id', flat=True))
@@ -0,0 +1,32 @@
+from django import forms
+from .models import CompanionCircle
+
+
+class CompanionCircleForm(forms.ModelForm):
+    """Lets a user start a group chat with some of their companions."""
+    members = forms.ModelMultipleChoiceField(
+        queryset=None,
+        widget=forms.CheckboxSelectMultiple,
+    )
+
+    class Meta:
+        model = CompanionCircle
+        fields = ('name', 'members')
+        labels = {
+            'name': 'Circle Name',
+            'members': 'Companions to invite',
+        }
+
+    def __init__(self, *args, owner, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.owner = owner
+        # Only people on the owner's companion list can be invited
+        self.fields['members'].queryset = owner.profile.companions.all()
+
+    def save(self, commit=True):
+        circle = super().save(commit=False)
+        circle.owner = self.owner
+        if commit:
+            circle.save()
+            circle.members.set([self.owner, *self.cleaned_data['members']])
+        return circle
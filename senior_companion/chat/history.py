@@ -0,0 +1,72 @@
+from datetime import datetime
+from django.db.models import Q
+from .models import Message
+
+
+def encode_cursor(created_at, message_id):
+    return f"{created_at.isoformat()}|{message_id}"
+
+
+def decode_cursor(cursor):
+    """Returns (created_at, id) or raises ValueError for a bad cursor."""
+    created_at, message_id = str(cursor).rsplit('|', 1)
+    return datetime.fromisoformat(created_at), int(message_id)
+
+
+def _serialize(row):
+    return {
+        'id': row['id'],
+        'message': row['body'],
+        'sender_email': row['sender__email'],
+        'created_at': row['created_at'].isoformat(),
+    }
+
+
+def load_history(room, cursor=None, page_size=50, until=None):
+    """
+    Returns one page of a room's messages, oldest first, plus the cursor
+    for the page before it (None when there's nothing older).
+    With `until`, only messages created before then are included.
+
+    This is keyset pagination: we ask for messages strictly older than
+    the cursor, newest first, so the database walks the
+    (room, -created_at, -id) index and reads only `page_size` rows no
+    matter how long the conversation is.
+    """
+    messages = Message.objects.filter(room=room)
+    if until is not None:
+        messages = messages.filter(created_at__lt=until)
+
+    if cursor is not None:
+        created_at, message_id = decode_cursor(cursor)
+        messages = messages.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id)
+        )
+
+    # One extra row tells us whether there's another page
+    rows = list(
+        messages.order_by('-created_at', '-id')
+        .values('id', 'body', 'created_at', 'sender__email')[:page_size + 1]
+    )
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id']) if has_more else None
+
+    page = [_serialize(row) for row in reversed(rows)]
+    return page, next_cursor
+
+
+def load_since(room, after, until, limit=50):
+    """
+    Messages newer than `after` (a message from a page of history, or
+    None for the very start) and created before `until`, oldest first.
+    """
+    messages = Message.objects.filter(room=room, created_at__lt=until)
+    if after is not None:
+        created_at = datetime.fromisoformat(after['created_at'])
+        messages = messages.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=after['id'])
+        )
+    rows = messages.order_by('created_at', 'id').values('id', 'body', 'created_at', 'sender__email')[:limit]
+    return [_serialize(row) for row in rows]
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-tests the configured channel layer: N rooms with M members '
+        'each, every room sending K messages at the same time, and reports '
+        'fan-out throughput (deliveries/sec) and delivery latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=50,
+                            help='Number of concurrent rooms.')
+        parser.add_argument('--members', type=int, default=2,
+                            help='Connections listening in each room.')
+        parser.add_argument('--messages', type=int, default=200,
+                            help='Messages sent to each room.')
+        parser.add_argument('--timeout', type=float, default=10.0,
+                            help='Seconds to wait for a delivery before counting it lost.')
+
+    def handle(self, *args, **options):
+        layer = get_channel_layer()
+        if layer is None:
+            raise CommandError('No channel layer is configured (CHANNEL_LAYERS).')
+
+        hosts = getattr(layer, 'hosts', None)
+        self.stdout.write(f"Layer:             {type(layer).__name__}" + (f" ({len(hosts)} host(s))" if hosts else ''))
+        stats = asyncio.run(self._run(layer, options))
+
+        self.stdout.write(f"Rooms x members:   {options['rooms']} x {options['members']}")
+        self.stdout.write(f"Messages sent:     {stats['sent']}")
+        self.stdout.write(f"Deliveries:        {stats['delivered']} of {stats['expected']}")
+        self.stdout.write(f"Fan-out:           {stats['rate']:.0f} deliveries/sec")
+        self.stdout.write(f"Latency p50:       {stats['p50']:.3f} ms")
+        self.stdout.write(f"Latency p95:       {stats['p95']:.3f} ms")
+        self.stdout.write(f"Latency p99:       {stats['p99']:.3f} ms")
+
+        if stats['delivered'] < stats['expected']:
+            raise CommandError(f"{stats['expected'] - stats['delivered']} deliveries were lost.")
+        self.stdout.write(self.style.SUCCESS('Benchmark complete.'))
+
+    async def _run(self, layer, options):
+        rooms, members, count = options['rooms'], options['members'], options['messages']
+
+        groups = [f'group_bench_{i}' for i in range(rooms)]
+        channels = {}
+        for group in groups:
+            channels[group] = [await layer.new_channel() for _ in range(members)]
+            for channel in channels[group]:
+                await layer.group_add(group, channel)
+
+        latencies = []
+
+        async def listen(channel):
+            received = 0
+            try:
+                while received < count:
+                    event = await asyncio.wait_for(layer.receive(channel), options['timeout'])
+                    latencies.append((time.perf_counter() - event['sent_at']) * 1000)
+                    received += 1
+            except asyncio.TimeoutError:
+                pass
+            return received
+
+        async def talk(group):
+            for i in range(count):
+                await layer.group_send(group, {
+                    'type': 'chat_message',
+                    'message': f'benchmark message {i}',
+                    'sender_email': 'bench@example.com',
+                    'sent_at': time.perf_counter(),
+                })
+                # Let listeners drain so we measure throughput, not queue capacity
+                await asyncio.sleep(0)
+
+        try:
+            listeners = [asyncio.create_task(listen(c)) for group in groups for c in channels[group]]
+            started = time.perf_counter()
+            await asyncio.gather(*(talk(group) for group in groups))
+            delivered = sum(await asyncio.gather(*listeners))
+            elapsed = time.perf_counter() - started
+        finally:
+            for group in groups:
+                for channel in channels[group]:
+                    await layer.group_discard(group, channel)
+
+        latencies.sort()
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+
+        return {
+            'sent': rooms * count,
+            'expected': rooms * members * count,
+            'delivered': delivered,
+            'rate': delivered / elapsed if elapsed else 0.0,
+            'p50': percentile(50),
+            'p95': percentile(95),
+            'p99': percentile(99),
+        }
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import time
+import uuid
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from chat.message_store import message_buffer
+from chat.routing import websocket_urlpatterns
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks ChatConsumer: opens one connection between two temporary '
+        'users, sends N messages one after another (waiting for each echo) '
+        'and reports messages/sec and round-trip latency for that connection.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000,
+                            help='Messages to send over the connection.')
+        parser.add_argument('--warmup', type=int, default=100,
+                            help='Messages sent first and left out of the results.')
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        sender = User.objects.create_user(username=f'bench_a_{tag}', email=f'bench_a_{tag}@example.com', password=tag)
+        other = User.objects.create_user(username=f'bench_b_{tag}', email=f'bench_b_{tag}@example.com', password=tag)
+
+        try:
+            # In-memory layer: we're measuring the consumer, not the broker.
+            # Rate limits are lifted, or we'd just be measuring those.
+            unlimited = 10 ** 9
+            with override_settings(
+                CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+                CHAT_CONNECTION_RATE=unlimited, CHAT_CONNECTION_BURST=unlimited,
+                CHAT_USER_RATE=unlimited, CHAT_USER_BURST=unlimited,
+            ):
+                stats = asyncio.run(self._run(sender, other, options['messages'], options['warmup']))
+        finally:
+            # Deleting the users also removes their saved messages
+            message_buffer.flush_sync()
+            User.objects.filter(pk__in=[sender.pk, other.pk]).delete()
+
+        self.stdout.write(f"Messages:          {stats['count']}")
+        self.stdout.write(f"Throughput:        {stats['rate']:.0f} messages/sec per connection")
+        self.stdout.write(f"Round trip p50:    {stats['p50']:.3f} ms")
+        self.stdout.write(f"Round trip p95:    {stats['p95']:.3f} ms")
+        self.stdout.write(self.style.SUCCESS('Benchmark complete.'))
+
+    async def _run(self, sender, other, count, warmup):
+        application = URLRouter(websocket_urlpatterns)
+        communicator = WebsocketCommunicator(application, f'/chat/{sender.id}/{other.id}/')
+        communicator.scope['user'] = sender
+
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise RuntimeError('The chat consumer refused the connection.')
+
+        async def receive(frame_type):
+            # Skip anything else the consumer sends on its own
+            # (presence changes, the delayed history catch-up)
+            while True:
+                frame = await communicator.receive_json_from()
+                if frame['type'] == frame_type:
+                    return frame
+
+        # connect() sends the history page, then the presence roster
+        await receive('history')
+        await receive('presence')
+
+        async def round_trip(i):
+            await communicator.send_to(text_data=json.dumps({'message': f'benchmark message {i}'}))
+            await receive('chat_message')
+
+        for i in range(warmup):
+            await round_trip(i)
+
+        timings = []
+        started = time.perf_counter()
+        for i in range(count):
+            t = time.perf_counter()
+            await round_trip(i)
+            timings.append((time.perf_counter() - t) * 1000)
+        elapsed = time.perf_counter() - started
+
+        await communicator.disconnect()
+        await message_buffer.flush()
+
+        timings.sort()
+        return {
+            'count': count,
+            'rate': count / elapsed if elapsed else 0.0,
+            'p50': timings[len(timings) // 2],
+            'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        }
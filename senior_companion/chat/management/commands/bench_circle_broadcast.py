@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+import uuid
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from chat.message_store import message_buffer
+from chat.models import CompanionCircle
+from chat.routing import websocket_urlpatterns
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks group chat fan-out: for each circle size, creates a '
+        'temporary circle, connects every member, has one member send N '
+        'messages and reports how long each takes to reach all members.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='2,10,50',
+                            help='Comma-separated circle sizes (members) to test.')
+        parser.add_argument('--messages', type=int, default=200,
+                            help='Messages to broadcast per circle size.')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated numbers, e.g. 2,10,50')
+        if min(sizes) < 2:
+            raise CommandError('A circle needs at least 2 members.')
+
+        # In-memory layer (measuring the consumer), rate limits lifted
+        unlimited = 10 ** 9
+        with override_settings(
+            CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+            CHAT_CONNECTION_RATE=unlimited, CHAT_CONNECTION_BURST=unlimited,
+            CHAT_USER_RATE=unlimited, CHAT_USER_BURST=unlimited,
+        ):
+            for size in sizes:
+                stats = self._bench_size(size, options['messages'])
+                self.stdout.write(
+                    f"{size:>4} members: p50 {stats['p50']:.3f} ms  p95 {stats['p95']:.3f} ms  "
+                    f"max {stats['max']:.3f} ms  ({stats['rate']:.0f} deliveries/sec)"
+                )
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete.'))
+
+    def _bench_size(self, size, count):
+        tag = uuid.uuid4().hex[:8]
+        users = [
+            User.objects.create_user(username=f'bench_{tag}_{i}', email=f'bench_{tag}_{i}@example.com', password=tag)
+            for i in range(size)
+        ]
+        circle = CompanionCircle.objects.create(owner=users[0], name=f'Benchmark {tag}')
+        circle.members.set(users)
+
+        try:
+            return asyncio.run(self._run(circle, users, count))
+        finally:
+            # Deleting the users also removes the circle and its messages
+            message_buffer.flush_sync()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    async def _run(self, circle, users, count):
+        application = URLRouter(websocket_urlpatterns)
+        members = []
+        for user in users:
+            communicator = WebsocketCommunicator(application, f'/chat/circle/{circle.id}/')
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            if not connected:
+                raise RuntimeError('The circle consumer refused a member.')
+            members.append(communicator)
+
+        # Skip the history and presence frames from everyone joining
+        for communicator in members:
+            while not await communicator.receive_nothing(0.01):
+                await communicator.receive_output()
+
+        async def receive_message(communicator):
+            while True:
+                frame = await communicator.receive_json_from(timeout=5)
+                if frame.get('type') == 'chat_message':
+                    return
+
+        sender = members[0]
+        timings = []
+        started = time.perf_counter()
+        for i in range(count):
+            t = time.perf_counter()
+            await sender.send_to(text_data=json.dumps({'message': f'benchmark message {i}'}))
+            await asyncio.gather(*(receive_message(c) for c in members))
+            timings.append((time.perf_counter() - t) * 1000)
+        elapsed = time.perf_counter() - started
+
+        for communicator in members:
+            await communicator.disconnect()
+        await message_buffer.flush()
+
+        timings.sort()
+        return {
+            'p50': timings[len(timings) // 2],
+            'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+            'max': timings[-1],
+            'rate': count * len(members) / elapsed if elapsed else 0.0,
+        }
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+import uuid
+
+from channels.layers import InMemoryChannelLayer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from chat.message_store import message_buffer
+from chat.models import CompanionCircle
+from chat.routing import websocket_urlpatterns
+
+User = get_user_model()
+
+
+class SoakChannelLayer(InMemoryChannelLayer):
+    """
+    InMemoryChannelLayer sweeps every channel and group for expired
+    messages on each send and receive. With thousands of connections that
+    sweep is O(connections) per message and swamps what we're trying to
+    measure (Redis doesn't work that way). Here it runs once a second.
+    """
+
+    _swept_at = 0.0
+
+    def _clean_expired(self):
+        now = time.monotonic()
+        if now - self._swept_at >= 1.0:
+            self._swept_at = now
+            super()._clean_expired()
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Soak test for ChatConsumer: opens many simulated connections across '
+        'many rooms (in-memory channel layer), has every connection send '
+        'messages, and reports connect latency, end-to-end delivery latency '
+        'and memory per connection. Use it to size Daphne workers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=1000,
+                            help='Total connections to open.')
+        parser.add_argument('--room-size', type=int, default=2,
+                            help='Connections per room: 2 uses 1:1 rooms, more uses companion circles.')
+        parser.add_argument('--messages', type=int, default=5,
+                            help='Messages each connection sends.')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Average seconds between one connection\'s messages.')
+        parser.add_argument('--concurrency', type=int, default=100,
+                            help='How many connections may be opening at the same time.')
+        parser.add_argument('--timeout', type=float, default=60.0,
+                            help='Seconds to wait for any single frame before giving up.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        room_size = options['room_size']
+        if room_size < 2:
+            raise CommandError('--room-size must be at least 2.')
+        rooms = max(1, options['connections'] // room_size)
+
+        self.stdout.write(f"Creating {rooms * room_size} users in {rooms} rooms...")
+        users, paths = self._create_rooms(rooms, room_size)
+
+        # Rate limits lifted: we're sizing workers, not testing the limiter
+        unlimited = 10 ** 9
+        try:
+            with override_settings(
+                CHANNEL_LAYERS={'default': {'BACKEND': f'{__name__}.SoakChannelLayer'}},
+                CHAT_CONNECTION_RATE=unlimited, CHAT_CONNECTION_BURST=unlimited,
+                CHAT_USER_RATE=unlimited, CHAT_USER_BURST=unlimited,
+            ):
+                stats = asyncio.run(self._soak(users, paths, room_size, options))
+        finally:
+            # Deleting the users also removes their rooms, messages and counters
+            message_buffer.flush_sync()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+        self._report(stats)
+
+    def _create_rooms(self, rooms, room_size):
+        tag = uuid.uuid4().hex[:8]
+        User.objects.bulk_create([
+            User(username=f'soak_{tag}_{i}', email=f'soak_{tag}_{i}@example.com', password='!')
+            for i in range(rooms * room_size)
+        ], batch_size=1000)
+        users = list(User.objects.filter(username__startswith=f'soak_{tag}_').order_by('id'))
+
+        paths = []
+        for r in range(rooms):
+            members = users[r * room_size:(r + 1) * room_size]
+            if room_size == 2:
+                paths.append(f'/chat/{members[0].id}/{members[1].id}/')
+            else:
+                circle = CompanionCircle.objects.create(owner=members[0], name=f'Soak {tag} {r}')
+                circle.members.set(members)
+                paths.append(f'/chat/circle/{circle.id}/')
+        return users, paths
+
+    async def _soak(self, users, paths, room_size, options):
+        application = URLRouter(websocket_urlpatterns)
+        rng = random.Random(options['seed'])
+        timeout = options['timeout']
+        count = options['messages']
+
+        # --- Phase 1: connect everyone, measuring memory while we do ---
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        connect_times = []
+
+        async def open_connection(user, path):
+            async with semaphore:
+                communicator = WebsocketCommunicator(application, path)
+                communicator.scope['user'] = user
+                started = time.perf_counter()
+                connected, _ = await communicator.connect(timeout=timeout)
+                connect_times.append((time.perf_counter() - started) * 1000)
+                if not connected:
+                    raise RuntimeError(f'Connection to {path} was refused.')
+                return communicator
+
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        communicators = await asyncio.gather(*(
+            open_connection(user, paths[i // room_size]) for i, user in enumerate(users)
+        ))
+        connect_elapsed = time.perf_counter() - started
+        # Let the join/presence chatter settle before we measure
+        await asyncio.sleep(1)
+        memory_used = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+
+        # --- Phase 2: everyone talks; every room member should get every message ---
+        latencies = []
+        expected = count * room_size
+
+        async def read(communicator):
+            received = 0
+            while received < expected:
+                frame = json.loads((await communicator.receive_output(timeout))['text'])
+                if frame.get('type') == 'chat_message':
+                    sent_at = float(frame['message'].split('|', 1)[0])
+                    latencies.append((time.perf_counter() - sent_at) * 1000)
+                    received += 1
+
+        async def talk(communicator):
+            for _ in range(count):
+                await asyncio.sleep(rng.uniform(0, 2 * options['interval']))
+                await communicator.send_to(text_data=json.dumps({
+                    'message': f'{time.perf_counter()}|soak test message',
+                }))
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(read(c) for c in communicators),
+            *(talk(c) for c in communicators),
+        )
+        traffic_elapsed = time.perf_counter() - started
+
+        for communicator in communicators:
+            await communicator.disconnect()
+        await message_buffer.flush()
+
+        connect_times.sort()
+        latencies.sort()
+        return {
+            'connections': len(communicators),
+            'rooms': len(paths),
+            'connect_times': connect_times,
+            'connect_elapsed': connect_elapsed,
+            'memory_per_connection': memory_used / len(communicators),
+            'sent': count * len(communicators),
+            'latencies': latencies,
+            'traffic_elapsed': traffic_elapsed,
+        }
+
+    def _report(self, stats):
+        connect_times, latencies = stats['connect_times'], stats['latencies']
+        self.stdout.write(f"Connections:        {stats['connections']} in {stats['rooms']} rooms")
+        self.stdout.write(
+            f"Connect latency:    p50 {percentile(connect_times, 50):.1f} ms  "
+            f"p95 {percentile(connect_times, 95):.1f} ms  p99 {percentile(connect_times, 99):.1f} ms  "
+            f"({stats['connections'] / stats['connect_elapsed']:.0f} connects/sec)"
+        )
+        self.stdout.write(f"Memory:             {stats['memory_per_connection'] / 1024:.1f} KB per connection (Python heap, incl. test client)")
+        self.stdout.write(f"Messages sent:      {stats['sent']}  ->  {len(latencies)} deliveries in {stats['traffic_elapsed']:.1f} s")
+        self.stdout.write(
+            f"Delivery latency:   p50 {percentile(latencies, 50):.2f} ms  p95 {percentile(latencies, 95):.2f} ms  "
+            f"p99 {percentile(latencies, 99):.2f} ms  max {latencies[-1] if latencies else 0:.2f} ms"
+        )
+        self.stdout.write(self.style.SUCCESS('Soak test complete.'))
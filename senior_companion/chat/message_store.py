@@ -0,0 +1,192 @@
+import asyncio
+import atexit
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Message, UnreadCounter
+
+
+class MessageWriteBuffer:
+    """
+    Write-behind buffer for chat messages.
+
+    ChatConsumer hands every message to add(), which only appends to a
+    list, so relaying a message never waits for the database. The list
+    is written with one bulk_create once it holds `batch_size` messages
+    or `flush_interval` seconds after the first unsaved message arrived,
+    whichever comes first. That's one thread hop per batch instead of
+    one per message.
+
+    The same write also bumps each recipient's UnreadCounter for the
+    room, once per (recipient, room) per batch rather than per message.
+    Recipients who weren't connected also get their offline_count bumped,
+    which is what chat.tasks.send_chat_digests emails them about.
+
+    If a write fails, the batch goes back to the front of the queue and
+    is tried again with the next flush (after a growing delay). Only after
+    `max_retries` failures in a row is it dropped (and reported in the
+    worker's output).
+
+    flush() also waits for writes that an earlier flush already started,
+    so once it returns, every message added before the call is saved.
+
+    One buffer is shared by all consumers in the process (they all run
+    on the same event loop).
+    """
+
+    def __init__(self, batch_size=100, flush_interval=0.5, max_retries=3):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._failures = 0  # failed writes in a row
+        self._pending = []
+        self._unread = {}  # (recipient id, room) -> [new messages, new while offline, last sender id]
+        self._timer = None
+        self._timer_loop = None
+        self._flushing = set()
+        self._writes = set()  # writes in progress
+
+    def add(self, room, sender_id, body, recipient_ids=(), offline_ids=()):
+        """
+        Queues a message and returns the time it's saved with.
+        Must be called from the event loop.
+        """
+        created_at = timezone.now()
+        self._pending.append(Message(
+            room=room,
+            sender_id=sender_id,
+            body=body,
+            created_at=created_at,
+        ))
+        for recipient_id in recipient_ids:
+            entry = self._unread.setdefault((recipient_id, room), [0, 0, sender_id])
+            entry[0] += 1
+            if recipient_id in offline_ids:
+                entry[1] += 1
+            entry[2] = sender_id
+
+        loop = asyncio.get_running_loop()
+        if self._timer is not None and self._timer_loop is not loop:
+            # Left over from an event loop that has since gone away
+            self._timer = None
+
+        if len(self._pending) >= self.batch_size and not self._failures:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_interval, self._schedule_flush)
+            self._timer_loop = loop
+        return created_at
+
+    def _schedule_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = asyncio.get_running_loop().create_task(self.flush())
+        # Keep a reference so the task isn't garbage collected mid-write
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def flush(self):
+        """Writes everything queued so far."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        loop = asyncio.get_running_loop()
+        earlier = [write for write in self._writes if write.get_loop() is loop]
+
+        batch, self._pending = self._pending, []
+        unread, self._unread = self._unread, {}
+        if not batch:
+            if earlier:
+                await asyncio.wait(earlier)
+            return 0
+
+        write = asyncio.ensure_future(database_sync_to_async(self._write)(batch, unread))
+        self._writes.add(write)
+        write.add_done_callback(self._writes.discard)
+        try:
+            if earlier:
+                await asyncio.wait(earlier)
+            await write
+        except Exception as e:
+            self._failures += 1
+            if self._failures > self.max_retries:
+                print(f"!!! DROPPING {len(batch)} chat messages after {self._failures} failed writes: {e} !!!")
+                self._failures = 0
+                return 0
+            print(f"!!! FAILED to save {len(batch)} chat messages (attempt {self._failures}), will retry: {e} !!!")
+            self._requeue(batch, unread)
+            return 0
+
+        self._failures = 0
+        return len(batch)
+
+    def _requeue(self, batch, unread):
+        """Puts a failed batch back in front of anything queued since, and retries later."""
+        self._pending = batch + self._pending
+        for key, (count, offline, last_sender_id) in unread.items():
+            entry = self._unread.get(key)
+            if entry is None:
+                self._unread[key] = [count, offline, last_sender_id]
+            else:
+                # The newer entry already has the right last sender
+                entry[0] += count
+                entry[1] += offline
+
+        # Replaces any earlier timer; while writes are failing, a full
+        # batch doesn't trigger an immediate flush either (see add())
+        if self._timer is not None:
+            self._timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(self.flush_interval * 2 ** self._failures, self._schedule_flush)
+        self._timer_loop = loop
+
+    def flush_sync(self):
+        """Writes what's left when the process exits (no event loop needed)."""
+        batch, self._pending = self._pending, []
+        unread, self._unread = self._unread, {}
+        if batch:
+            self._write(batch, unread)
+
+    @staticmethod
+    def _write(batch, unread):
+        with transaction.atomic():
+            Message.objects.bulk_create(batch)
+            if not unread:
+                return
+            # Make sure every counter row exists, then add to each one.
+            # F() keeps the increment correct if another worker got there first.
+            UnreadCounter.objects.bulk_create(
+                [UnreadCounter(user_id=user_id, room=room) for user_id, room in unread],
+                ignore_conflicts=True,
+            )
+            # update() skips auto_now, so set updated_at ourselves: the home
+            # page and the digests list the most recently active room first
+            now = timezone.now()
+            for (user_id, room), (count, offline, last_sender_id) in unread.items():
+                UnreadCounter.objects.filter(user_id=user_id, room=room).update(
+                    count=F('count') + count,
+                    offline_count=F('offline_count') + offline,
+                    last_sender_id=last_sender_id,
+                    updated_at=now,
+                )
+
+
+# --- Process-wide buffer ---
+message_buffer = MessageWriteBuffer(
+    batch_size=getattr(settings, 'CHAT_MESSAGE_BATCH_SIZE', 100),
+    flush_interval=getattr(settings, 'CHAT_MESSAGE_FLUSH_INTERVAL', 0.5),
+    max_retries=getattr(settings, 'CHAT_MESSAGE_MAX_RETRIES', 3),
+)
+
+
+@atexit.register
+def _flush_on_exit():
+    # Don't lose the last few messages when the worker shuts down
+    try:
+        message_buffer.flush_sync()
+    except Exception as e:
+        print(f"!!! FAILED to save chat messages on exit: {e} !!!")
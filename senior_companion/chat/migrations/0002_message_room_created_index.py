@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='room',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['room', '-created_at', '-id'], name='chat_msg_room_created_idx'),
+        ),
+    ]
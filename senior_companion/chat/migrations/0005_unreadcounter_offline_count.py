@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_unreadcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unreadcounter',
+            name='offline_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
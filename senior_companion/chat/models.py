@@ -1,3 +1,102 @@
 from django.db import models
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
 
 # Create your models here.
+
+class Message(models.Model):
+    """
+    One chat message sent in a room (e.g. 'chat_3_7').
+    Saved in batches by chat/message_store.py, not one by one.
+    """
+    room = models.CharField(max_length=100)
+    sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='chat_messages'
+    )
+    body = models.TextField()
+    # Set when the message arrives, not when the batch is written
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # History is read newest-first, one page at a time, per room.
+            # (created_at, id) is the page cursor; id breaks ties.
+            models.Index(fields=['room', '-created_at', '-id'], name='chat_msg_room_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.sender} in {self.room}: {self.body[:30]}"
+
+
+class CompanionCircle(models.Model):
+    """
+    A group chat room: the owner plus some of their companions.
+    Its messages are stored under the room name 'circle_<id>'.
+    """
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='owned_circles'
+    )
+    name = models.CharField(max_length=100)
+    # Always includes the owner
+    members = models.ManyToManyField(
+        settings.AUTH_USER_MODEL,
+        related_name='companion_circles'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def room_name(self):
+        return f'circle_{self.id}'
+
+    def __str__(self):
+        return self.name
+
+
+class UnreadCounter(models.Model):
+    """
+    How many messages in `room` arrived for `user` since they last had it
+    open. Bumped by the message write buffer when a batch is saved, and
+    set back to 0 when the user opens or leaves the room, so the home
+    page reads badges straight from here instead of counting messages.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='unread_counters'
+    )
+    room = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+    # The part of `count` that arrived while the user had no socket open
+    # in the room and hasn't been emailed yet (see chat.tasks)
+    offline_count = models.PositiveIntegerField(default=0)
+    # Who sent the newest unread message ("3 new messages from Asha")
+    last_sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'room'], name='chat_unread_user_room_uniq'),
+        ]
+
+    @property
+    def url(self):
+        """Where the badge links to: the 1:1 chat or the circle."""
+        if self.room.startswith('circle_'):
+            return reverse('circle_room', args=[int(self.room.split('_')[1])])
+        # 'chat_3_7' -> the other person in it
+        first, second = (int(part) for part in self.room.split('_')[1:])
+        return reverse('chat_room', args=[second if first == self.user_id else first])
+
+    def __str__(self):
+        return f"{self.user}: {self.count} unread in {self.room}"
@@ -0,0 +1,46 @@
+import time
+
+
+class PresenceRoster:
+    """
+    Who is connected to a room, as one connection sees it.
+
+    Each entry is {channel name: (user id, email, expires)}. The other
+    connections refresh their entries with a heartbeat, and an entry that
+    hasn't been refreshed for `ttl` seconds is dropped the next time the
+    roster is read. A connection that vanishes without saying goodbye
+    (worker crash, lost network) therefore stops counting as online by
+    itself instead of staying "online" forever.
+    """
+
+    def __init__(self, ttl, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = {}
+
+    def add(self, channel, user_id, email, permanent=False):
+        """Adds or refreshes an entry. Returns True if it's new."""
+        expires = float('inf') if permanent else self.clock() + self.ttl
+        new = channel not in self._entries
+        self._entries[channel] = (user_id, email, expires)
+        return new
+
+    def remove(self, channel):
+        """Returns True if the channel was in the roster."""
+        return self._entries.pop(channel, None) is not None
+
+    def prune(self):
+        """Drops expired entries. Returns True if any were dropped."""
+        now = self.clock()
+        expired = [channel for channel, (_, _, expires) in self._entries.items() if expires <= now]
+        for channel in expired:
+            del self._entries[channel]
+        return bool(expired)
+
+    def user_ids(self):
+        self.prune()
+        return {user_id for user_id, _, _ in self._entries.values()}
+
+    def emails(self):
+        self.prune()
+        return sorted({email for _, email, _ in self._entries.values()})
@@ -0,0 +1,49 @@
+import time
+
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to `burst` tokens and refills at
+    `rate` tokens per second. Each frame takes one; when the bucket is
+    empty the frame is refused. Short bursts are fine, a sustained flood
+    is capped at `rate`.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, cost=1):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+
+# --- Per-user buckets ---
+# Shared by all of a user's connections in this process, so opening more
+# tabs doesn't buy more throughput. Consumers all run on one event loop,
+# so no lock is needed. An entry is dropped when its last connection closes.
+_user_buckets = {}  # user id -> [bucket, open connections]
+
+
+def acquire_user_bucket(user_id, rate, burst):
+    entry = _user_buckets.get(user_id)
+    if entry is None:
+        entry = _user_buckets[user_id] = [TokenBucket(rate, burst), 0]
+    entry[1] += 1
+    return entry[0]
+
+
+def release_user_bucket(user_id):
+    entry = _user_buckets.get(user_id)
+    if entry is None:
+        return
+    entry[1] -= 1
+    if entry[1] <= 0:
+        del _user_buckets[user_id]
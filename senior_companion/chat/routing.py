@@ -2,6 +2,7 @@
 
 from django.urls import re_path
 from . import consumers
+from chatbot.consumers import BotConsumer
 
 websocket_urlpatterns = [
     # Make sure your path does NOT have 'ws/' at the start
@@ -9,4 +10,8 @@ websocket_urlpatterns = [
         r'^chat/(?P<user_1_id>\d+)/(?P<user_2_id>\d+)/$', 
         consumers.ChatConsumer.as_asgi()
     ),
+    # Group chats for companion circles
+    re_path(r'^chat/circle/(?P<circle_id>\d+)/$', consumers.CircleChatConsumer.as_asgi()),
+    # The chatbot widget keeps one socket open per page
+    re_path(r'^bot/ws/$', BotConsumer.as_asgi()),
 ]
\ No newline at end of file
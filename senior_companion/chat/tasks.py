@@ -0,0 +1,77 @@
+from itertools import groupby
+
+from celery import shared_task
+from django.core.mail import send_mail
+from django.db.models import F
+
+from .models import UnreadCounter
+
+
+@shared_task
+def send_chat_digests():
+    """
+    Runs every CHAT_DIGEST_INTERVAL seconds. Emails each user who received
+    chat messages while they weren't connected ONE digest covering all of
+    their rooms, however many messages arrived since the last run.
+
+    "Not connected" is decided when the message is sent: the sender's
+    presence roster only counts someone whose heartbeat it heard within
+    CHAT_PRESENCE_TTL, so a connection left behind by a crashed worker
+    doesn't stop that user's digests.
+    """
+    pending = (
+        UnreadCounter.objects
+        .filter(offline_count__gt=0)
+        .select_related('user', 'last_sender')
+        .order_by('user_id', '-updated_at')
+    )
+
+    sent = 0
+    for user, counters in groupby(pending, key=lambda counter: counter.user):
+        counters = list(counters)
+        total = sum(counter.offline_count for counter in counters)
+
+        lines = []
+        for counter in counters:
+            plural = 's' if counter.offline_count != 1 else ''
+            sender = f" from {counter.last_sender.email}" if counter.last_sender else ''
+            group = ' (group chat)' if counter.room.startswith('circle_') else ''
+            lines.append(f"  {counter.offline_count} new message{plural}{sender}{group}")
+        summary = "\n".join(lines)
+
+        subject = f"You have {total} new message{'s' if total != 1 else ''} on Senior Companion"
+        message_body = f"""
+Hello, {user.username}!
+Your companions sent you messages while you were away:
+
+{summary}
+
+Log in to read and reply to them.
+
+- The Senior Companion Team
+"""
+
+        try:
+            send_mail(
+                subject,
+                message_body,
+                None,          # From: DEFAULT_FROM_EMAIL
+                [user.email],  # To
+                fail_silently=False,
+            )
+        except Exception as e:
+            print(f"!!! FAILED to send chat digest to {user.email}: {e} !!!")
+            continue
+
+        # Subtract what we reported rather than zeroing, so messages that
+        # arrived while we were sending go in the next digest. (If the user
+        # opened the room meanwhile it's already 0 and there's nothing to do.)
+        for counter in counters:
+            UnreadCounter.objects.filter(
+                pk=counter.pk, offline_count__gte=counter.offline_count
+            ).update(offline_count=F('offline_count') - counter.offline_count)
+
+        sent += 1
+        print(f"!!! SENT chat digest to {user.email} ({total} messages) !!!")
+
+    return sent
@@ -1,3 +1,453 @@
-from django.test import TestCase
+import asyncio
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .forms import CompanionCircleForm
+from .history import decode_cursor, load_history, load_since
+from .message_store import MessageWriteBuffer, message_buffer
+from .models import CompanionCircle, Message, UnreadCounter
+from .presence import PresenceRoster
+from .rate_limit import TokenBucket, acquire_user_bucket, release_user_bucket
+from .routing import websocket_urlpatterns
+from .tasks import send_chat_digests
+
+User = get_user_model()
+
+
+class MessageWriteBufferTests(TestCase):
+
+    def setUp(self):
+        self.asha = User.objects.create(username='asha', email='asha@example.com')
+        self.ravi = User.objects.create(username='ravi', email='ravi@example.com')
+        # Long interval: the tests flush by hand
+        self.buffer = MessageWriteBuffer(batch_size=100, flush_interval=60, max_retries=2)
+
+    def add(self, body):
+        self.buffer.add('chat_1_2', self.asha.id, body, recipient_ids={self.ravi.id})
+
+    def failing_writes(self):
+        return mock.patch.object(Message.objects, 'bulk_create', side_effect=RuntimeError('database is down'))
+
+    async def test_failed_batch_is_retried_in_order(self):
+        self.add('first')
+        self.add('second')
+        with self.failing_writes(), mock.patch('builtins.print') as printed:
+            self.assertEqual(await self.buffer.flush(), 0)
+        self.assertIn('will retry', printed.call_args.args[0])
+
+        self.add('third')
+        self.assertEqual(await self.buffer.flush(), 3)
+
+        bodies = [body async for body in Message.objects.order_by('created_at', 'id').values_list('body', flat=True)]
+        self.assertEqual(bodies, ['first', 'second', 'third'])
+        counter = await UnreadCounter.objects.aget(user=self.ravi, room='chat_1_2')
+        self.assertEqual(counter.count, 3)
+
+    async def test_batch_is_dropped_after_max_retries(self):
+        self.add('lost')
+        with self.failing_writes(), mock.patch('builtins.print') as printed:
+            for _ in range(3):
+                await self.buffer.flush()
+        self.assertIn('DROPPING 1 chat messages after 3 failed writes', printed.call_args.args[0])
+
+        # Nothing left to retry, and the next message is saved normally
+        self.add('saved')
+        self.assertEqual(await self.buffer.flush(), 1)
+        self.assertEqual(await Message.objects.acount(), 1)
+
+
+    async def test_newest_activity_comes_first_after_another_batch(self):
+        self.add('morning')  # chat_1_2
+        await self.buffer.flush()
+        self.buffer.add('circle_7', self.asha.id, 'hello all', recipient_ids={self.ravi.id})
+        await self.buffer.flush()
+        self.add('are you there?')  # chat_1_2 again
+        await self.buffer.flush()
+
+        rooms = [room async for room in self.ravi.unread_counters.order_by('-updated_at').values_list('room', flat=True)]
+        self.assertEqual(rooms, ['chat_1_2', 'circle_7'])
+
+
+class HistoryTests(TestCase):
+
+    def setUp(self):
+        self.asha = User.objects.create(username='asha', email='asha@example.com')
+        self.start = timezone.now() - timedelta(hours=1)
+
+    def create(self, *seconds):
+        """One message per offset (in seconds from self.start); returns their ids in order."""
+        messages = Message.objects.bulk_create([
+            Message(room='chat_1_2', sender=self.asha, body=f'message {i}', created_at=self.start + timedelta(seconds=offset))
+            for i, offset in enumerate(seconds)
+        ])
+        return [message.id for message in messages]
+
+    def all_pages(self, page_size, **kwargs):
+        pages = []
+        cursor = None
+        while True:
+            page, cursor = load_history('chat_1_2', cursor=cursor, page_size=page_size, **kwargs)
+            pages.append([message['id'] for message in page])
+            if cursor is None:
+                return pages
+
+    def test_messages_with_equal_timestamps_are_neither_skipped_nor_repeated(self):
+        ids = self.create(0, 5, 5, 5, 5, 5, 9)
+        pages = self.all_pages(page_size=2)
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual([i for page in reversed(pages) for i in page], ids)
+
+    def test_last_page_has_no_cursor(self):
+        ids = self.create(0, 1, 2)
+        # Exactly one full page: nothing older, so no "load older" button
+        self.assertEqual(self.all_pages(page_size=3), [ids])
+        self.assertEqual(self.all_pages(page_size=2), [ids[1:], ids[:1]])
+        self.assertEqual(load_history('empty_room'), ([], None))
+
+    def test_invalid_cursors_are_rejected(self):
+        for cursor in ['garbage', 'yesterday|12', '2026-01-01T10:00:00|twelve', '']:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    decode_cursor(cursor)
+                with self.assertRaises(ValueError):
+                    load_history('chat_1_2', cursor=cursor)
+
+    def test_until_and_catch_up_split_at_the_same_moment(self):
+        ids = self.create(0, 1, 2, 3, 4)
+        joined_at = self.start + timedelta(seconds=3)
+
+        page, _cursor = load_history('chat_1_2', page_size=2, until=joined_at)
+        self.assertEqual([message['id'] for message in page], ids[1:3])
+        # Catch-up picks up after the newest message of that page, up to joining
+        self.assertEqual(load_since('chat_1_2', page[-1], joined_at), [])
+        self.assertEqual([message['id'] for message in load_since('chat_1_2', None, joined_at)], ids[:3])
+
+        late = self.create(2)  # saved late, but sent before we joined
+        self.assertEqual([message['id'] for message in load_since('chat_1_2', page[-1], joined_at)], late)
+
+    async def test_flush_waits_for_a_write_already_in_progress(self):
+        buffer = MessageWriteBuffer(batch_size=100, flush_interval=60)
+        write = buffer._write
+
+        def slow_write(batch, unread):
+            time.sleep(0.2)
+            write(batch, unread)
+
+        buffer._write = slow_write
+        buffer.add('chat_1_2', self.asha.id, 'hello')
+        earlier = asyncio.ensure_future(buffer.flush())
+        await asyncio.sleep(0)  # it has taken the batch and started writing
+
+        self.assertEqual(await buffer.flush(), 0)
+        self.assertEqual(await Message.objects.acount(), 1)
+        await earlier
+
+
+class TokenBucketTests(TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('chat.rate_limit.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_refused(self):
+        bucket = TokenBucket(rate=5, burst=3)
+        self.assertEqual([bucket.take() for _ in range(4)], [True, True, True, False])
+
+    def test_refills_at_rate_up_to_burst(self):
+        bucket = TokenBucket(rate=5, burst=3)
+        for _ in range(3):
+            bucket.take()
+        self.now += 0.2  # one token
+        self.assertEqual([bucket.take(), bucket.take()], [True, False])
+
+        self.now += 60  # refills to the burst, no further
+        self.assertEqual(sum(bucket.take() for _ in range(10)), 3)
+
+    def test_user_bucket_is_shared_until_the_last_connection_releases_it(self):
+        first = acquire_user_bucket(42, rate=5, burst=3)
+        second = acquire_user_bucket(42, rate=5, burst=3)
+        self.assertIs(first, second)
+
+        release_user_bucket(42)
+        self.assertIs(acquire_user_bucket(42, rate=5, burst=3), first)
+        release_user_bucket(42)
+        release_user_bucket(42)
+        self.assertIsNot(acquire_user_bucket(42, rate=5, burst=3), first)
+        release_user_bucket(42)
+
+
+class PresenceRosterTests(TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.roster = PresenceRoster(ttl=90, clock=lambda: self.now)
+        self.roster.add('me', 1, 'asha@example.com', permanent=True)
+
+    def test_entries_expire_without_a_heartbeat(self):
+        self.roster.add('ravi-tab', 2, 'ravi@example.com')
+        self.now = 60
+        self.assertEqual(self.roster.user_ids(), {1, 2})
+
+        self.now = 91
+        self.assertEqual(self.roster.user_ids(), {1})
+        self.assertEqual(self.roster.emails(), ['asha@example.com'])
+
+    def test_heartbeat_extends_an_entry(self):
+        self.roster.add('ravi-tab', 2, 'ravi@example.com')
+        self.now = 60
+        self.assertFalse(self.roster.add('ravi-tab', 2, 'ravi@example.com'))
+        self.now = 120
+        self.assertEqual(self.roster.user_ids(), {1, 2})
+
+    def test_own_entry_never_expires(self):
+        self.now = 10 ** 6
+        self.assertFalse(self.roster.prune())
+        self.assertEqual(self.roster.user_ids(), {1})
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CHAT_HISTORY_CATCH_UP_DELAY=0.1,
+)
+class ChatConnectTests(TestCase):
+
+    def setUp(self):
+        self.asha = User.objects.create(username='asha', email='asha@example.com')
+        self.ravi = User.objects.create(username='ravi', email='ravi@example.com')
+        self.room = f'chat_{min(self.asha.id, self.ravi.id)}_{max(self.asha.id, self.ravi.id)}'
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/chat/{self.asha.id}/{self.ravi.id}/')
+        communicator.scope['user'] = user
+        connected, _code = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def receive(self, communicator, frame_type):
+        while True:
+            frame = await communicator.receive_json_from(timeout=2)
+            if frame['type'] == frame_type:
+                return frame
+
+    async def test_message_saved_late_by_another_worker_is_caught_up(self):
+        communicator = await self.connect(self.asha)
+        history = await self.receive(communicator, 'history')
+        self.assertEqual(history['messages'], [])
+
+        # Ravi's worker still had this in its buffer when we loaded history
+        late = await Message.objects.acreate(
+            room=self.room, sender=self.ravi, body='are you there?',
+            created_at=timezone.now() - timedelta(seconds=1),
+        )
+        catch_up = await self.receive(communicator, 'history')
+        self.assertTrue(catch_up['catch_up'])
+        self.assertEqual([message['id'] for message in catch_up['messages']], [late.id])
+        await communicator.disconnect()
+
+    async def test_live_messages_carry_the_saved_timestamp(self):
+        asha = await self.connect(self.asha)
+        ravi = await self.connect(self.ravi)
+        await self.receive(ravi, 'history')
+
+        await asha.send_json_to({'message': 'good morning'})
+        frame = await self.receive(ravi, 'chat_message')
+        await asha.disconnect()  # flushes the buffer
+        saved = await Message.objects.aget(room=self.room)
+        self.assertEqual(frame['created_at'], saved.created_at.isoformat())
+        await ravi.disconnect()
+
+    @override_settings(CHAT_TYPING_INTERVAL=0.3)
+    async def test_typing_bursts_are_coalesced(self):
+        asha = await self.connect(self.asha)
+        ravi = await self.connect(self.ravi)
+        await self.receive(ravi, 'presence')
+
+        async def typing_frames():
+            frames = []
+            while not await ravi.receive_nothing(timeout=0.1):
+                frame = await ravi.receive_json_from()
+                if frame['type'] == 'typing':
+                    frames.append(frame['typing'])
+            return frames
+
+        # A burst of keystrokes: just the change to "typing"
+        for _ in range(8):
+            await asha.send_json_to({'type': 'typing', 'typing': True})
+        self.assertEqual(await typing_frames(), [True])
+
+        # Still typing after the interval: one refresh, however many keystrokes
+        await asyncio.sleep(0.3)
+        for _ in range(5):
+            await asha.send_json_to({'type': 'typing', 'typing': True})
+        self.assertEqual(await typing_frames(), [True])
+
+        # Stopping is a change of state, passed on straight away, once
+        for _ in range(3):
+            await asha.send_json_to({'type': 'typing', 'typing': False})
+        self.assertEqual(await typing_frames(), [False])
+
+        await ravi.disconnect()
+        await asha.disconnect()
+
+    @override_settings(CHAT_MAX_VIOLATIONS=2)
+    async def test_repeated_bad_frames_close_the_socket(self):
+        asha = await self.connect(self.asha)
+        for _ in range(2):
+            await asha.send_to(text_data='not json')
+            self.assertEqual((await self.receive(asha, 'error'))['message'], "Sorry, that message couldn't be read.")
+
+        await asha.send_to(text_data='not json')
+        while True:
+            output = await asha.receive_output(timeout=2)
+            if output['type'] == 'websocket.close':
+                break
+        self.assertEqual(output['code'], 4008)
+
+    @override_settings(CHAT_MAX_VIOLATIONS=2, CHAT_VIOLATION_WINDOW=0.1)
+    async def test_occasional_bad_frames_never_close_the_socket(self):
+        asha = await self.connect(self.asha)
+        for _ in range(5):
+            await asha.send_to(text_data='not json')
+            await self.receive(asha, 'error')
+            await asyncio.sleep(0.15)
+
+        await asha.send_json_to({'message': 'still connected'})
+        self.assertEqual((await self.receive(asha, 'chat_message'))['message'], 'still connected')
+        await asha.disconnect()
+
+    @override_settings(CHAT_PRESENCE_HEARTBEAT=0.1, CHAT_PRESENCE_TTL=0.3)
+    async def test_peer_that_stops_heartbeating_drops_out_of_presence(self):
+        asha = await self.connect(self.asha)
+        self.assertEqual((await self.receive(asha, 'presence'))['online'], ['asha@example.com'])
+
+        # A connection on a worker that then crashes: it joins, but never
+        # sends a heartbeat or a leave
+        await get_channel_layer().group_send(f'group_{self.room}', {
+            'type': 'presence_join',
+            'channel': 'specific.crashed!1',
+            'sender_id': self.ravi.id,
+            'sender_email': self.ravi.email,
+        })
+        self.assertEqual((await self.receive(asha, 'presence'))['online'], ['asha@example.com', 'ravi@example.com'])
+        self.assertEqual((await self.receive(asha, 'presence'))['online'], ['asha@example.com'])
+        await asha.disconnect()
+
+    async def test_messages_read_live_are_not_counted_as_unread(self):
+        asha = await self.connect(self.asha)
+        await self.receive(asha, 'presence')
+        ravi = await self.connect(self.ravi)
+        await self.receive(asha, 'presence')  # ravi joined
+
+        await asha.send_json_to({'message': 'tea at four?'})
+        await self.receive(ravi, 'chat_message')
+        # Ravi read it as it arrived: no badge in his other tabs
+        await message_buffer.flush()
+        self.assertFalse(await UnreadCounter.objects.filter(user=self.ravi, count__gt=0).aexists())
+
+        await ravi.disconnect()
+        self.assertEqual((await self.receive(asha, 'presence'))['online'], ['asha@example.com'])
+
+        await asha.send_json_to({'message': 'ravi?'})
+        await self.receive(asha, 'chat_message')
+        await message_buffer.flush()
+        counter = await UnreadCounter.objects.aget(user=self.ravi, room=self.room)
+        self.assertEqual((counter.count, counter.offline_count), (1, 1))
+        await asha.disconnect()
+
+    @override_settings(CHAT_PRESENCE_HEARTBEAT=60, CHAT_PRESENCE_TTL=0.2)
+    async def test_recipient_with_a_stale_presence_entry_gets_a_digest(self):
+        asha = await self.connect(self.asha)
+        await self.receive(asha, 'presence')
+        await get_channel_layer().group_send(f'group_{self.room}', {
+            'type': 'presence_join',
+            'channel': 'specific.crashed!1',
+            'sender_id': self.ravi.id,
+            'sender_email': self.ravi.email,
+        })
+        self.assertIn('ravi@example.com', (await self.receive(asha, 'presence'))['online'])
+
+        # Ravi's entry expires before the next heartbeat round would prune
+        # it, so it's the expiry time alone that makes him offline here
+        await asyncio.sleep(0.3)
+        await asha.send_json_to({'message': 'are you awake?'})
+        await self.receive(asha, 'chat_message')
+        await asha.disconnect()  # flushes the buffer
+
+        self.assertEqual(await sync_to_async(send_chat_digests)(), 1)
+        self.assertEqual(mail.outbox[0].to, ['ravi@example.com'])
+
+    @override_settings(CHAT_PRESENCE_HEARTBEAT=0.1, CHAT_PRESENCE_TTL=0.3)
+    async def test_heartbeats_keep_a_live_peer_in_presence(self):
+        asha = await self.connect(self.asha)
+        await self.receive(asha, 'presence')
+        ravi = await self.connect(self.ravi)
+        self.assertEqual((await self.receive(asha, 'presence'))['online'], ['asha@example.com', 'ravi@example.com'])
+
+        # Twice the TTL: ravi is never dropped, so asha gets no new roster
+        self.assertTrue(await asha.receive_nothing(timeout=0.6))
+        await ravi.disconnect()
+        await asha.disconnect()
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class CircleAccessTests(TestCase):
+
+    def setUp(self):
+        self.asha = User.objects.create(username='asha', email='asha@example.com')
+        self.ravi = User.objects.create(username='ravi', email='ravi@example.com')
+        self.stranger = User.objects.create(username='stranger', email='stranger@example.com')
+        self.circle = CompanionCircle.objects.create(owner=self.asha, name='Family')
+        self.circle.members.set([self.asha, self.ravi])
+
+    async def connect(self, user, path):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+        communicator.scope['user'] = user
+        connected, _code = await communicator.connect()
+        if connected:
+            await communicator.disconnect()
+        return connected
+
+    async def test_circle_socket_is_for_members_only(self):
+        path = f'/chat/circle/{self.circle.id}/'
+        self.assertTrue(await self.connect(self.ravi, path))
+        self.assertFalse(await self.connect(self.stranger, path))
+        self.assertFalse(await self.connect(AnonymousUser(), path))
+
+    async def test_one_to_one_socket_is_for_the_two_users_only(self):
+        path = f'/chat/{self.asha.id}/{self.ravi.id}/'
+        self.assertFalse(await self.connect(self.stranger, path))
+        self.assertFalse(await self.connect(AnonymousUser(), path))
+
+    def test_circle_room_is_not_found_for_non_members(self):
+        url = reverse('circle_room', args=[self.circle.id])
+        self.client.force_login(self.stranger)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.force_login(self.ravi)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_circle_form_only_offers_the_owners_companions(self):
+        self.asha.profile.companions.add(self.ravi)
+
+        form = CompanionCircleForm({'name': 'Walkers', 'members': [self.ravi.id, self.stranger.id]}, owner=self.asha)
+        self.assertFalse(form.is_valid())
+        self.assertIn('members', form.errors)
+
+        form = CompanionCircleForm({'name': 'Walkers', 'members': [self.ravi.id]}, owner=self.asha)
+        self.assertTrue(form.is_valid())
+        circle = form.save()
+        self.assertEqual(set(circle.members.all()), {self.asha, self.ravi})
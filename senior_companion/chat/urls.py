@@ -4,4 +4,10 @@ from . import views
 urlpatterns = [
     # This URL will be /chat/5/ (to chat with user ID 5)
     path('<int:other_user_id>/', views.chat_room, name='chat_room'),
-]
\ No newline at end of file
+
+    # /chat/circles/ (your group chats, and a form to start one)
+    path('circles/', views.circle_list, name='circle_list'),
+
+    # /chat/circles/3/ (the group chat for circle 3)
+    path('circles/<int:circle_id>/', views.circle_room, name='circle_room'),
+]
@@ -1,6 +1,9 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
+from .forms import CompanionCircleForm
+from .models import CompanionCircle
 
 User = get_user_model()
 
@@ -18,10 +21,42 @@ def chat_room(request, other_user_id):
         # Swap them
         user_1_id, user_2_id = user_2_id, user_1_id
 
-    # We pass the sorted IDs and the other user's email to the template
+    # We pass the socket path and the other user's email to the template
     context = {
-        'other_user_email': other_user.email,
-        'user_1_id': user_1_id,
-        'user_2_id': user_2_id,
+        'room_title': f'Chat with {other_user.email}',
+        'socket_path': f'/chat/{user_1_id}/{user_2_id}/',
     }
-    return render(request, 'chat/chat_room.html', context)
\ No newline at end of file
+    return render(request, 'chat/chat_room.html', context)
+
+# --- Companion Circles (group chats) ---
+
+@login_required
+def circle_list(request):
+    """
+    Lists the user's circles and lets them start a new one
+    with people from their companion list.
+    """
+    if request.method == 'POST':
+        form = CompanionCircleForm(request.POST, owner=request.user)
+        if form.is_valid():
+            circle = form.save()
+            messages.success(request, f'Your circle "{circle.name}" has been created!')
+            return redirect('circle_room', circle_id=circle.id)
+    else:
+        form = CompanionCircleForm(owner=request.user)
+
+    circles = request.user.companion_circles.prefetch_related('members')
+    return render(request, 'chat/circle_list.html', {
+        'form': form,
+        'circles': circles,
+    })
+
+@login_required
+def circle_room(request, circle_id):
+    # Only members can open a circle (404 rather than revealing it exists)
+    circle = get_object_or_404(CompanionCircle, id=circle_id, members=request.user)
+    context = {
+        'room_title': circle.name,
+        'socket_path': f'/chat/circle/{circle.id}/',
+    }
+    return render(request, 'chat/chat_room.html', context)
@@ -3,15 +3,18 @@ from .models import LogicRule, UnansweredQuery
 
 @admin.register(LogicRule)
 class LogicRuleAdmin(admin.ModelAdmin):
-    list_display = ('pattern', 'match_type', 'priority', 'response')
+    list_display = ('pattern', 'match_type', 'priority', 'response', 'is_active', 'disabled_reason')
+    list_filter = ('is_active', 'match_type')
     ordering = ('-priority',)
     search_fields = ('pattern', 'response')
+    readonly_fields = ('disabled_reason',)
 
 @admin.register(UnansweredQuery)
 class UnansweredQueryAdmin(admin.ModelAdmin):
-    list_display = ('query_text', 'user', 'timestamp', 'is_resolved')
+    list_display = ('query_text', 'user', 'hit_count', 'timestamp', 'last_seen', 'is_resolved')
     list_filter = ('is_resolved', 'timestamp')
-    readonly_fields = ('timestamp',)
+    ordering = ('-hit_count', '-timestamp')
+    readonly_fields = ('timestamp', 'last_seen', 'hit_count')
     actions = ['mark_as_resolved']
 
     def mark_as_resolved(self, request, queryset):
@@ -0,0 +1,69 @@
+import json
+import time
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from .logic_engine import answer_message
+
+
+class BotConsumer(AsyncWebsocketConsumer):
+    """
+    One WebSocket per chatbot widget.
+
+    The widget keeps this socket open while the page is open, so each
+    question skips the HTTP request, CSRF check and session lookup.
+    scope['user'] is resolved once by AuthMiddlewareStack at connect.
+
+    Backpressure: questions longer than CHATBOT_WS_MAX_MESSAGE_LENGTH,
+    or more than CHATBOT_WS_MAX_MESSAGES in CHATBOT_WS_WINDOW seconds,
+    are answered with an error frame instead of being processed.
+    """
+
+    async def connect(self):
+        self.max_length = getattr(settings, 'CHATBOT_WS_MAX_MESSAGE_LENGTH', 500)
+        self.max_messages = getattr(settings, 'CHATBOT_WS_MAX_MESSAGES', 20)
+        self.window = getattr(settings, 'CHATBOT_WS_WINDOW', 10)
+
+        self.window_started = time.monotonic()
+        self.window_count = 0
+
+        await self.accept()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if text_data is None or len(text_data) > self.max_length + 100:
+            await self.send_error("Your message is too long.")
+            return
+
+        if not self.allow_message():
+            await self.send_error("You're sending messages too quickly. Please wait a moment.")
+            return
+
+        try:
+            data = json.loads(text_data)
+            message = str(data.get('message', ''))[:self.max_length]
+        except (ValueError, AttributeError):
+            await self.send_error("Sorry, I couldn't read that message.")
+            return
+
+        if not message.strip():
+            return
+
+        result = await answer_message(message, user=self.scope.get('user'))
+
+        await self.send(text_data=json.dumps({
+            'status': 'success',
+            'id': data.get('id'),
+            'response': result['response'],
+            'link': result['link'],
+        }))
+
+    def allow_message(self):
+        """Fixed-window counter: at most max_messages per window."""
+        now = time.monotonic()
+        if now - self.window_started >= self.window:
+            self.window_started = now
+            self.window_count = 0
+        self.window_count += 1
+        return self.window_count <= self.max_messages
+
+    async def send_error(self, message):
+        await self.send(text_data=json.dumps({'status': 'error', 'message': message}))
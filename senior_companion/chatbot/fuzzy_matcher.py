@@ -0,0 +1,142 @@
+import re
+
+_WORDS = re.compile(r'\w+')
+
+
+def _deletes(word, distance):
+    """Every string you can get by removing up to `distance` characters."""
+    results = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        results |= frontier
+    return results
+
+
+def edit_distance(a, b, limit):
+    """
+    Levenshtein distance between `a` and `b`.
+    Gives up early and returns limit + 1 once the distance must exceed `limit`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb),
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class FuzzyMatcher:
+    """
+    Typo-tolerant lookup of 'contains' keywords and 'exact' phrases.
+
+    At build time every pattern is stored under all the strings you get by
+    deleting up to N of its characters. At query time we do the same to the
+    message's words and look them up, so a typo like "hospitel" meets
+    "hospital" at "hosptl" without comparing against every rule. Candidates
+    are then confirmed with a real edit distance.
+
+    The allowed number of typos grows with the length of the pattern, so
+    short words like "pill" never match fuzzily ("pull", "fill"...).
+    """
+
+    def __init__(self, keywords, phrases, rank, max_distance=2):
+        self._rank = rank
+        self.max_distance = max_distance
+
+        self._patterns = []  # (pattern, payload, is_phrase)
+        self._index = {}     # deleted variant -> [pattern number]
+        self._ngram_sizes = set()
+        # Longest phrase / keyword; anything much longer can't be a near match
+        self._longest = {True: 0, False: 0}
+
+        for pattern, payload in keywords:
+            self._add(pattern, payload, is_phrase=False)
+        for pattern, payload in phrases:
+            self._add(pattern, payload, is_phrase=True)
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def allowed_distance(self, length):
+        if length < 5:
+            return 0
+        if length < 8:
+            return min(1, self.max_distance)
+        return self.max_distance
+
+    def _add(self, pattern, payload, is_phrase):
+        distance = self.allowed_distance(len(pattern))
+        if not distance:
+            return
+        number = len(self._patterns)
+        self._patterns.append((pattern, payload, is_phrase))
+        for variant in _deletes(pattern, distance):
+            self._index.setdefault(variant, []).append(number)
+        if not is_phrase:
+            self._ngram_sizes.add(len(pattern.split()))
+        self._longest[is_phrase] = max(self._longest[is_phrase], len(pattern))
+
+    def _candidates(self, cleaned_input):
+        """The whole message (for phrases) plus word n-grams (for keywords)."""
+        if self._longest[True]:
+            yield cleaned_input, True
+        words = _WORDS.findall(cleaned_input)
+        for size in self._ngram_sizes:
+            for i in range(len(words) - size + 1):
+                yield ' '.join(words[i:i + size]), False
+
+    def match(self, cleaned_input):
+        """
+        Returns (payload, distance) for the closest pattern within its typo
+        budget, preferring fewer typos and then higher priority.
+        Returns (None, None) if nothing is close enough.
+        """
+        if not self._patterns:
+            return None, None
+
+        best = None
+        best_key = None
+        seen = set()
+
+        for text, whole_message in self._candidates(cleaned_input):
+            if (text, whole_message) in seen or len(text) > self._longest[whole_message] + self.max_distance:
+                continue
+            seen.add((text, whole_message))
+
+            # A typo budget belongs to the pattern, and patterns can be up to
+            # max_distance longer than the text, so delete for the longest one.
+            deletions = self.allowed_distance(len(text) + self.max_distance)
+            if not deletions:
+                continue
+
+            # Many variants lead to the same pattern; only verify it once
+            checked = set()
+            for variant in _deletes(text, deletions):
+                for number in self._index.get(variant, ()):
+                    if number in checked:
+                        continue
+                    checked.add(number)
+                    pattern, payload, is_phrase = self._patterns[number]
+                    if is_phrase != whole_message:
+                        continue
+                    limit = self.allowed_distance(len(pattern))
+                    distance = edit_distance(text, pattern, limit)
+                    if distance > limit:
+                        continue
+                    key = (distance, self._rank(payload))
+                    if best_key is None or key < best_key:
+                        best, best_key = payload, key
+
+        if best is None:
+            return None, None
+        return best, best_key[0]
@@ -0,0 +1,146 @@
+from collections import deque
+
+# How a 'contains' keyword has to line up with the words of the message.
+#   'substring' - anywhere, even inside a longer word ('play' matches 'display')
+#   'prefix'    - at the start of a word ('learn' matches 'learning', not 'unlearn')
+#   'word'      - as a whole word only ('game' does not match 'games')
+BOUNDARY_MODES = ('substring', 'prefix', 'word')
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+
+class KeywordMatcher:
+    """
+    An Aho-Corasick automaton over all 'contains' keywords.
+
+    One left-to-right pass over the message finds every keyword in it,
+    so the cost of a lookup depends on the length of the message and the
+    number of hits, not on how many keywords exist.
+
+    `keywords` is an iterable of (pattern, payload) pairs and `rank` is a
+    sort key for payloads (lower wins). If the same pattern appears twice,
+    only the best-ranked payload is kept.
+    """
+
+    def __init__(self, keywords, rank, boundary='substring'):
+        if boundary not in BOUNDARY_MODES:
+            raise ValueError(f"Unknown boundary mode {boundary!r}, expected one of {BOUNDARY_MODES}")
+
+        self.boundary = boundary
+        self._rank = rank
+
+        # One entry per trie node
+        self._goto = [{}]       # char -> child node
+        self._fail = [0]        # longest proper suffix that is also a trie path
+        self._output = [None]   # (pattern length, payload) if a keyword ends here
+        self._dict_link = [-1]  # next node down the fail chain with an output
+        self._best = [None]     # best payload ending here or on the fail chain
+
+        for pattern, payload in keywords:
+            if pattern:
+                self._insert(pattern, payload)
+        self._build_links()
+
+    def __len__(self):
+        return sum(1 for output in self._output if output is not None)
+
+    def _insert(self, pattern, payload):
+        node = 0
+        for ch in pattern:
+            child = self._goto[node].get(ch)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][ch] = child
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._dict_link.append(-1)
+                self._best.append(None)
+            node = child
+
+        current = self._output[node]
+        if current is None or self._rank(payload) < self._rank(current[1]):
+            self._output[node] = (len(pattern), payload)
+
+    def _better(self, a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return a if self._rank(a) <= self._rank(b) else b
+
+    def _build_links(self):
+        # Breadth-first, so a node's fail target is always finished first
+        queue = deque()
+        for child in self._goto[0].values():
+            self._best[child] = self._own_payload(child)
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(ch, 0)
+                if fail == child:
+                    fail = 0
+
+                self._fail[child] = fail
+                self._dict_link[child] = fail if self._output[fail] is not None else self._dict_link[fail]
+                self._best[child] = self._better(self._own_payload(child), self._best[fail])
+                queue.append(child)
+
+    def _own_payload(self, node):
+        output = self._output[node]
+        return output[1] if output is not None else None
+
+    def _step(self, state, ch):
+        goto = self._goto
+        while state and ch not in goto[state]:
+            state = self._fail[state]
+        return goto[state].get(ch, 0)
+
+    def _on_boundary(self, text, start, end):
+        if start > 0 and _is_word_char(text[start - 1]):
+            return False
+        if self.boundary == 'word' and end < len(text) and _is_word_char(text[end]):
+            return False
+        return True
+
+    def find_all(self, text):
+        """
+        Yields (start, end, payload) for every keyword found in `text`,
+        in the order their last character is reached.
+        """
+        state = 0
+        for i, ch in enumerate(text):
+            state = self._step(state, ch)
+            node = state if self._output[state] is not None else self._dict_link[state]
+            while node > 0:
+                length, payload = self._output[node]
+                start = i - length + 1
+                if self.boundary == 'substring' or self._on_boundary(text, start, i + 1):
+                    yield start, i + 1, payload
+                node = self._dict_link[node]
+
+    def best(self, text):
+        """Returns the best-ranked payload found in `text`, or None."""
+        if self.boundary != 'substring':
+            best = None
+            for _start, _end, payload in self.find_all(text):
+                best = self._better(best, payload)
+            return best
+
+        # Fast path: every node already knows the best keyword ending there,
+        # so we never have to walk the output chain.
+        best = None
+        state = 0
+        for ch in text:
+            state = self._step(state, ch)
+            candidate = self._best[state]
+            if candidate is not None:
+                best = self._better(best, candidate)
+        return best
@@ -1,5 +1,8 @@
-import re
-from .models import LogicRule, UnansweredQuery
+from asgiref.sync import sync_to_async
+from .response_cache import response_cache
+from .rule_index import get_rule_index, peek_rule_index
+from .semantic_index import semantic_match
+from .unanswered_log import unanswered_buffer
 
 class ChatBotEngine:
     def process(self, user_input, user=None):
@@ -9,38 +12,85 @@ class ChatBotEngine:
         """
         cleaned_input = user_input.lower().strip()
         
-        # 1. Fetch all rules, sorted by priority (high first)
-        rules = LogicRule.objects.all().order_by('-priority')
-        
-        # 2. Iterate through rules (First Order Logic simulation)
-        for rule in rules:
-            match_found = False
-            pattern = rule.pattern.lower()
-            
-            if rule.match_type == 'exact':
-                if cleaned_input == pattern:
-                    match_found = True
-            
-            elif rule.match_type == 'contains':
-                # Check if the keyword exists as a distinct word
-                if f" {pattern} " in f" {cleaned_input} " or pattern in cleaned_input:
-                    match_found = True
-            
-            elif rule.match_type == 'regex':
-                if re.search(pattern, cleaned_input):
-                    match_found = True
-            
-            # 3. If Logic Holds -> Return Result
-            if match_found:
-                return {
-                    'response': rule.response,
-                    'link': rule.suggested_link,
-                    'found': True
-                }
-        
-        # 4. No Match Found -> Escalate to Admin
+        # 1. Look the input up in the pre-compiled rule index
+        #    (built once per process, no database query per message)
+        index = get_rule_index()
+        rule = self._find_rule(index, cleaned_input)
+        
+        # 2. If Logic Holds -> Return Result
+        if rule is not None:
+            return self._answer(rule)
+        
+        # 3. No Match Found -> Escalate to Admin
         self._log_unanswered(user_input, user)
         
+        return self._not_understood()
+
+    async def aprocess(self, user_input, user=None):
+        """
+        Async version of process() for async views and consumers.
+
+        Exact, keyword and fuzzy answers come from the in-memory index,
+        right on the event loop. Anything that can block runs in a worker
+        thread: building the index (database), the regex rules (a bad
+        pattern that got in without the admin form's probe can run for
+        ages, and `re` can't be interrupted), the TF-IDF fallback (file
+        checks, maybe loading the index from disk) and logging a miss.
+        `user` may be a user object or an async function returning one
+        (e.g. request.auser), which is only awaited when we have to log
+        an unanswered question.
+        """
+        cleaned_input = user_input.lower().strip()
+        
+        index = peek_rule_index()
+        if index is None:
+            index = await sync_to_async(get_rule_index)()
+        
+        rule = index.match_literal(cleaned_input)
+        if len(index.regexes):
+            rule = await sync_to_async(index.regexes.search, thread_sensitive=False)(cleaned_input, best=rule)
+        if rule is None:
+            rule = index.fuzzy_match(cleaned_input)
+        if rule is None:
+            rule = await sync_to_async(semantic_match, thread_sensitive=False)(cleaned_input, index)
+        if rule is not None:
+            return self._answer(rule)
+        
+        if callable(user):
+            user = await user()
+        await sync_to_async(self._log_unanswered, thread_sensitive=False)(user_input, user)
+        
+        return self._not_understood()
+
+    def _find_rule(self, index, cleaned_input):
+        """Runs the input through each matching tier, strictest first."""
+        rule = self._find_rule_in_memory(index, cleaned_input)
+        
+        # Still nothing? Find the rule whose text is most similar
+        # (TF-IDF index built by 'manage.py build_chatbot_index')
+        if rule is None:
+            rule = semantic_match(cleaned_input, index)
+        
+        return rule
+
+    def _find_rule_in_memory(self, index, cleaned_input):
+        """The tiers that never leave memory: exact, keyword, regex, then typos."""
+        rule = index.match(cleaned_input)
+        
+        # Nothing matched as typed? Allow for a few typos
+        if rule is None:
+            rule = index.fuzzy_match(cleaned_input)
+        
+        return rule
+
+    def _answer(self, rule):
+        return {
+            'response': rule.response,
+            'link': rule.link,
+            'found': True
+        }
+
+    def _not_understood(self):
         return {
             'response': "I'm sorry, I don't understand that question yet. I have notified the support staff, and they will look into it.",
             'link': None,
@@ -50,7 +100,31 @@ class ChatBotEngine:
     def _log_unanswered(self, text, user):
         # Don't log tiny gibberish (optional filter)
         if len(text) > 2:
-            UnansweredQuery.objects.create(
-                user=user if user and user.is_authenticated else None,
-                query_text=text
-            )
\ No newline at end of file
+            # Queued in memory and saved in batches by a background thread,
+            # so the user gets their reply without waiting for an INSERT
+            unanswered_buffer.add(
+                text,
+                user_id=user.id if user and user.is_authenticated else None
+            )
+
+
+
+async def answer_message(message, user=None):
+    """
+    The full async answer path shared by the HTTP endpoint and the
+    WebSocket consumer: answer cache first, then the engine.
+    `user` is passed on to ChatBotEngine.aprocess.
+    """
+    # Popular questions are answered straight from the cache
+    result = await response_cache.aget(message)
+    if result is not None:
+        return result
+
+    # Get the answer (the user is only needed if we have
+    # to log an unanswered question)
+    result = await ChatBotEngine().aprocess(message, user=user)
+
+    # Only cache real answers; misses must still reach the admin log
+    if result['found']:
+        await response_cache.aset(message, result)
+    return result
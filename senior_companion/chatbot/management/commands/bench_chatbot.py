@@ -0,0 +1,148 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from chatbot.logic_engine import ChatBotEngine
+from chatbot.models import LogicRule
+from chatbot.rule_index import get_rule_index, invalidate_rule_index
+
+
+class _BenchEngine(ChatBotEngine):
+    # Misses would otherwise be queued and saved for real by the background
+    # logger, after we've rolled the synthetic rules back
+    def _log_unanswered(self, text, user):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks ChatBotEngine.process: adds N synthetic rules of each '
+        'match type (rolled back afterwards), replays a query corpus and '
+        'reports latency percentiles, throughput and DB queries per call.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rules', type=int, default=1000,
+                            help='Synthetic rules to add per match type (contains, exact, regex).')
+        parser.add_argument('--queries', type=int, default=5000,
+                            help='Number of queries to replay.')
+        parser.add_argument('--corpus', default=None,
+                            help='Text file with one query per line (default: generated).')
+        parser.add_argument('--max-p95-ms', type=float, default=None,
+                            help='Fail (non-zero exit) if p95 latency is above this.')
+        parser.add_argument('--max-queries-per-call', type=float, default=None,
+                            help='Fail if the average DB queries per call is above this.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        with transaction.atomic():
+            words = self._create_rules(rng, options['rules'])
+            invalidate_rule_index()
+
+            try:
+                start = time.perf_counter()
+                index = get_rule_index()
+                build_ms = (time.perf_counter() - start) * 1000
+
+                queries = self._load_corpus(options['corpus']) or self._make_corpus(rng, words, options['queries'])
+                stats = self._replay(queries, options['queries'])
+            finally:
+                # Never keep the synthetic rules
+                transaction.set_rollback(True)
+
+        invalidate_rule_index()
+
+        self.stdout.write(f"Rules in index:      {index.size}")
+        self.stdout.write(f"Index build:         {build_ms:.1f} ms")
+        self.stdout.write(f"Queries replayed:    {stats['count']}  ({stats['found']} answered)")
+        self.stdout.write(f"Latency p50:         {stats['p50']:.3f} ms")
+        self.stdout.write(f"Latency p95:         {stats['p95']:.3f} ms")
+        self.stdout.write(f"Latency p99:         {stats['p99']:.3f} ms")
+        self.stdout.write(f"Latency max:         {stats['max']:.3f} ms")
+        self.stdout.write(f"Throughput:          {stats['qps']:.0f} queries/sec")
+        self.stdout.write(f"DB queries per call: {stats['db_per_call']:.3f}")
+
+        failures = []
+        if options['max_p95_ms'] is not None and stats['p95'] > options['max_p95_ms']:
+            failures.append(f"p95 {stats['p95']:.3f} ms > {options['max_p95_ms']} ms")
+        if options['max_queries_per_call'] is not None and stats['db_per_call'] > options['max_queries_per_call']:
+            failures.append(f"{stats['db_per_call']:.3f} DB queries per call > {options['max_queries_per_call']}")
+        if failures:
+            raise CommandError('Chatbot benchmark regression: ' + '; '.join(failures))
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete.'))
+
+    def _word(self, rng):
+        return ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10)))
+
+    def _create_rules(self, rng, count):
+        """Adds `count` rules per match type; returns the words used."""
+        words = [self._word(rng) for _ in range(count)]
+        phrases = [f'{self._word(rng)} {self._word(rng)}' for _ in range(count)]
+        rules = []
+        for i in range(count):
+            rules.append(LogicRule(pattern=words[i], match_type='contains', response=f'Contains answer {i}', priority=rng.randint(1, 20)))
+            rules.append(LogicRule(pattern=phrases[i], match_type='exact', response=f'Exact answer {i}', priority=rng.randint(1, 20)))
+            rules.append(LogicRule(pattern=rf'\border {self._word(rng)} \d+', match_type='regex', response=f'Regex answer {i}', priority=rng.randint(1, 20)))
+        LogicRule.objects.bulk_create(rules, batch_size=1000)
+        return {'contains': words, 'exact': phrases}
+
+    def _load_corpus(self, path):
+        if not path:
+            return None
+        with open(path, encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+
+    def _make_corpus(self, rng, words, count):
+        """A mix of keyword hits, exact hits, typos and questions nobody answers."""
+        queries = []
+        for _ in range(count):
+            kind = rng.random()
+            if kind < 0.4:
+                queries.append(f'how do i {rng.choice(words["contains"])} please')
+            elif kind < 0.6:
+                queries.append(rng.choice(words['exact']))
+            elif kind < 0.75:
+                word = rng.choice(words['contains'])
+                i = rng.randrange(len(word))
+                queries.append(f'where is {word[:i] + word[i + 1:]}')
+            else:
+                queries.append(' '.join(self._word(rng) for _ in range(rng.randint(3, 8))))
+        return queries
+
+    def _replay(self, queries, count):
+        engine = _BenchEngine()
+        timings = []
+        found = 0
+
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            for i in range(count):
+                query = queries[i % len(queries)]
+                t = time.perf_counter()
+                result = engine.process(query)
+                timings.append((time.perf_counter() - t) * 1000)
+                found += result['found']
+            elapsed = time.perf_counter() - started
+
+        timings.sort()
+
+        def percentile(p):
+            return timings[min(len(timings) - 1, int(len(timings) * p / 100))]
+
+        return {
+            'count': count,
+            'found': found,
+            'p50': percentile(50),
+            'p95': percentile(95),
+            'p99': percentile(99),
+            'max': timings[-1],
+            'qps': count / elapsed if elapsed else 0.0,
+            'db_per_call': len(captured.captured_queries) / count,
+        }
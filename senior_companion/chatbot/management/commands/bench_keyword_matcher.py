@@ -0,0 +1,71 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from chatbot.keyword_matcher import KeywordMatcher
+from chatbot.rule_index import CompiledRule, _rank
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the Aho-Corasick keyword matcher against a plain '
+        'one-rule-at-a-time scan for growing numbers of contains rules. '
+        'Runs fully in memory; the database is not touched.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='50,500,5000,50000',
+                            help='Comma separated rule counts to test.')
+        parser.add_argument('--queries', type=int, default=2000,
+                            help='Number of messages to match per size.')
+        parser.add_argument('--boundary', default='substring',
+                            help="Boundary mode: 'substring', 'prefix' or 'word'.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        sizes = [int(size) for size in options['sizes'].split(',')]
+
+        self.stdout.write(f"{'rules':>8} {'build ms':>10} {'automaton us/q':>15} {'linear us/q':>13}")
+
+        for size in sizes:
+            keywords = [
+                (self._word(rng), CompiledRule(i, rng.randint(1, 20), f'Answer {i}', None))
+                for i in range(size)
+            ]
+            queries = self._queries(rng, keywords, options['queries'])
+
+            start = time.perf_counter()
+            matcher = KeywordMatcher(keywords, rank=_rank, boundary=options['boundary'])
+            build_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            for query in queries:
+                matcher.best(query)
+            automaton_us = (time.perf_counter() - start) / len(queries) * 1e6
+
+            # The old approach: test every keyword against the message
+            ranked = sorted(keywords, key=lambda item: _rank(item[1]))
+            start = time.perf_counter()
+            for query in queries:
+                for pattern, _rule in ranked:
+                    if pattern in query:
+                        break
+            linear_us = (time.perf_counter() - start) / len(queries) * 1e6
+
+            self.stdout.write(f'{size:>8} {build_ms:>10.1f} {automaton_us:>15.1f} {linear_us:>13.1f}')
+
+    def _word(self, rng):
+        return ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10)))
+
+    def _queries(self, rng, keywords, count):
+        """Builds realistic-length messages; about half contain a known keyword."""
+        queries = []
+        for _ in range(count):
+            words = [self._word(rng) for _ in range(rng.randint(3, 10))]
+            if rng.random() < 0.5:
+                words.insert(rng.randrange(len(words) + 1), rng.choice(keywords)[0])
+            queries.append(' '.join(words))
+        return queries
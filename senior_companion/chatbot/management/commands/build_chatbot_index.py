@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.rule_index import RuleIndex
+from chatbot.semantic_index import build_semantic_index, get_index_dir
+
+class Command(BaseCommand):
+    help = 'Rebuilds the TF-IDF index the chatbot falls back to when no rule matches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help='Directory to write the index to (defaults to CHATBOT_SEMANTIC_INDEX_DIR).')
+
+    def handle(self, *args, **options):
+        output_dir = options['output'] or get_index_dir()
+
+        # Build a fresh rule index so resolved questions are matched
+        # against the rules as they are right now
+        rule_index = RuleIndex.from_database()
+
+        try:
+            documents, rules = build_semantic_index(rule_index, output_dir)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {documents} documents covering {rules} rules into {output_dir}.'
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logicrule',
+            name='disabled_reason',
+            field=models.CharField(blank=True, help_text='Why the chatbot switched this rule off.', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='logicrule',
+            name='is_active',
+            field=models.BooleanField(default=True, help_text='Inactive rules are ignored by the chatbot.'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_logicrule_is_active_disabled_reason'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='unansweredquery',
+            name='hit_count',
+            field=models.PositiveIntegerField(default=1, help_text='How many times this question was asked.'),
+        ),
+        migrations.AddField(
+            model_name='unansweredquery',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, help_text='When this question was last asked.', null=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def fill_last_seen(apps, schema_editor):
+    # Rows from before 0003 were last asked when they were first asked.
+    # One UPDATE for the whole table.
+    UnansweredQuery = apps.get_model('chatbot', 'UnansweredQuery')
+    UnansweredQuery.objects.filter(last_seen__isnull=True).update(last_seen=F('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_unansweredquery_hit_count_last_seen'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_last_seen, migrations.RunPython.noop),
+    ]
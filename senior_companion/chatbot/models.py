@@ -1,5 +1,8 @@
 from django.db import models
 from django.conf import settings
+from django.core.exceptions import ValidationError
+import re
+from .regex_matcher import probe_regex
 
 class LogicRule(models.Model):
     """
@@ -24,9 +27,34 @@ class LogicRule(models.Model):
     
     priority = models.IntegerField(default=1, help_text="Higher numbers are checked first.")
 
+    # Regex rules that run too slowly are switched off automatically
+    is_active = models.BooleanField(default=True, help_text="Inactive rules are ignored by the chatbot.")
+    disabled_reason = models.CharField(max_length=255, blank=True, help_text="Why the chatbot switched this rule off.")
+
     def __str__(self):
         return f"Rule: {self.pattern} -> {self.response[:30]}..."
 
+    def clean(self):
+        """
+        Reject regex patterns that don't compile or that
+        hang on simple adversarial input (catastrophic backtracking).
+        """
+        if self.match_type != 'regex':
+            return
+
+        try:
+            re.compile(self.pattern)
+        except re.error as e:
+            raise ValidationError({'pattern': f"This is not a valid regular expression: {e}"})
+
+        timeout = getattr(settings, 'CHATBOT_REGEX_PROBE_TIMEOUT', 1.0)
+        if not probe_regex(self.pattern, timeout=timeout):
+            raise ValidationError({'pattern': "This pattern is too slow (it may backtrack catastrophically). Please simplify it."})
+
+        # A pattern that passed the check may be switched back on
+        if self.is_active:
+            self.disabled_reason = ''
+
 class UnansweredQuery(models.Model):
     """
     Stores queries that the bot could not understand.
@@ -37,5 +65,10 @@ class UnansweredQuery(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     is_resolved = models.BooleanField(default=False)
 
+    # Repeats of the same question are counted on one row instead of
+    # creating a new row each time
+    hit_count = models.PositiveIntegerField(default=1, help_text="How many times this question was asked.")
+    last_seen = models.DateTimeField(null=True, blank=True, help_text="When this question was last asked.")
+
     def __str__(self):
         return f"Unanswered: {self.query_text[:50]}..."
\ No newline at end of file
@@ -0,0 +1,190 @@
+import multiprocessing
+import re
+import time
+from itertools import groupby
+
+# Patterns using these features can't be safely glued into one big
+# alternation (group numbers shift, names clash, global flags must come first),
+# so they are searched on their own.
+_UNMERGEABLE = re.compile(r'\\[1-9]|\(\?P[<=]|\(\?[aiLmsux-]+\)')
+
+
+class RegexMatcher:
+    """
+    Evaluates all 'regex' LogicRules with a per-message time budget.
+
+    Rules are grouped by priority (highest first). Inside a group, every
+    pattern that can be merged is combined into one regex with a named
+    group per rule, so a group costs a single call into `re`. Each rule
+    sits in a lookahead that scans the whole message, and the rules are
+    tried best-ranked first, so the winner is the same rule that checking
+    them one by one would pick (not just the one matching furthest left).
+
+    Python's `re` can't be interrupted, so a runaway pattern is detected
+    *after* the search returns. If it was part of a combined regex, the
+    group is split so the next slow search points at the exact rule; a
+    rule searched on its own is reported through `on_slow`, which decides
+    whether it's slow often enough to switch off.
+
+    `rules` is an iterable of (payload, pattern) pairs; payloads need a
+    `priority` and an `id` attribute.
+    """
+
+    def __init__(self, rules, rank, budget=0.05, on_slow=None):
+        self._rank = rank
+        self.budget = budget
+        self.on_slow = on_slow
+
+        rules = sorted(rules, key=lambda item: rank(item[0]))
+        self._groups = []
+        for priority, members in groupby(rules, key=lambda item: item[0].priority):
+            self._groups.append((priority, self._compile_group(list(members))))
+
+    def __len__(self):
+        return sum(len(members) for _priority, units in self._groups for _regex, members in units)
+
+    def _compile_group(self, members):
+        """
+        Returns a list of units: (compiled regex, {group name: (payload, pattern)}).
+        Mergeable patterns share one unit, the rest get one unit each
+        under the group name None.
+        """
+        units = []
+        mergeable = []
+
+        for payload, pattern in members:
+            try:
+                regex = re.compile(pattern, re.IGNORECASE)
+            except re.error:
+                # A broken admin-entered pattern should not take the bot down
+                continue
+            if len(members) == 1 or _UNMERGEABLE.search(pattern):
+                units.append((regex, {None: (payload, pattern)}))
+            else:
+                mergeable.append((payload, pattern))
+
+        if len(mergeable) == 1:
+            units.extend(self._standalone(mergeable))
+        elif mergeable:
+            # Anchored at the start of the message (we call match(), not
+            # search()): alternative N only runs if alternatives 1..N-1
+            # match nowhere in the message. `members` is already in rank order.
+            alternation = '|'.join(f'(?=(?s:.*?)(?P<r{payload.id}>{pattern}))' for payload, pattern in mergeable)
+            try:
+                units.append((
+                    re.compile(alternation, re.IGNORECASE),
+                    {f'r{payload.id}': (payload, pattern) for payload, pattern in mergeable},
+                ))
+            except re.error:
+                units.extend(self._standalone(mergeable))
+
+        return units
+
+    def _standalone(self, members):
+        return [(re.compile(pattern, re.IGNORECASE), {None: (payload, pattern)}) for payload, pattern in members]
+
+    def search(self, text, best=None):
+        """
+        Returns the best payload matching `text`, or `best` if no regex rule
+        can beat it. Stops early once the per-message budget is spent.
+        """
+        started = time.perf_counter()
+
+        for priority, units in self._groups:
+            if best is not None and best.priority > priority:
+                break
+
+            found = None
+            for unit in units:
+                regex, members = unit
+                unit_started = time.perf_counter()
+                # A combined regex is anchored (see _compile_group)
+                match = regex.search(text) if None in members else regex.match(text)
+                elapsed = time.perf_counter() - unit_started
+
+                if elapsed > self.budget:
+                    self._report_slow(unit, elapsed)
+
+                if match:
+                    payload = members[None if None in members else match.lastgroup][0]
+                    if found is None or self._rank(payload) < self._rank(found):
+                        found = payload
+
+                if time.perf_counter() - started > self.budget:
+                    print(f"!!! Chatbot regex budget of {self.budget * 1000:.0f} ms used up, skipping remaining regex rules !!!")
+                    return self._pick(best, found)
+
+            if found is not None:
+                return self._pick(best, found)
+
+        return best
+
+    def _pick(self, best, found):
+        if found is None:
+            return best
+        if best is None or self._rank(found) < self._rank(best):
+            return found
+        return best
+
+    def _report_slow(self, unit, elapsed):
+        _regex, members = unit
+        if None in members:
+            # One slow search may just be a GC pause or a busy host;
+            # on_slow keeps count and switches the rule off if it repeats
+            if self.on_slow is not None:
+                self.on_slow(members[None][0], elapsed)
+            return
+
+        # We don't know which member was slow yet, so give each its own
+        # unit; the next slow search will point at the exact rule.
+        replacement = self._standalone(members.values())
+
+        # Build new lists and swap them in, so concurrent readers
+        # never see a half-edited group.
+        self._groups = [
+            (priority, [new for u in units for new in ([u] if u is not unit else replacement)])
+            for priority, units in self._groups
+        ]
+
+
+# --- Safety check for admin-entered patterns ---
+
+def _probe_strings(pattern):
+    """
+    Inputs that tend to trigger catastrophic backtracking:
+    long runs of the characters the pattern itself mentions,
+    followed by a character that forces the match to fail.
+    """
+    chars = sorted({ch for ch in pattern.lower() if ch.isalnum()})[:10] or ['a']
+    probes = [ch * 40 + '!' for ch in chars + [' ', '1']]
+    probes.append(''.join(chars) * 10 + '!')
+    return probes
+
+
+def _run_probes(pattern, conn):
+    regex = re.compile(pattern, re.IGNORECASE)
+    conn.send('ready')
+    for probe in _probe_strings(pattern):
+        regex.search(probe)
+    conn.send('done')
+
+
+def probe_regex(pattern, timeout=1.0):
+    """
+    Runs `pattern` against a few adversarial inputs in a separate process.
+    Returns False if it didn't finish within `timeout` seconds
+    (process start-up time is not counted).
+    """
+    context = multiprocessing.get_context('spawn')
+    parent_conn, child_conn = context.Pipe()
+    process = context.Process(target=_run_probes, args=(pattern, child_conn), daemon=True)
+    process.start()
+    try:
+        finished = parent_conn.poll(30) and parent_conn.recv() == 'ready' and parent_conn.poll(timeout)
+    except EOFError:
+        # The child died (e.g. the pattern didn't compile); nothing hung
+        finished = True
+    if process.is_alive():
+        process.terminate()
+    process.join()
+    return bool(finished)
@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .rule_index import invalidate_rule_index, peek_rule_index
+
+GENERATION_KEY = 'chatbot:response:generation'
+
+
+def normalize_message(message):
+    """'  How do I  REGISTER ' and 'how do i register' share one cache entry."""
+    return ' '.join(message.lower().split())
+
+
+class ResponseCache:
+    """
+    Remembers the bot's answer for recently asked questions.
+
+    By default it's a per-process LRU dict. Every entry is stamped with the
+    generation of the rule index it came from, so when the rules change
+    (and the index is rebuilt) old answers are simply ignored.
+
+    If `shared_alias` names a Django cache (e.g. Redis), answers live there
+    instead and are shared by all workers. Rule changes then bump a
+    generation counter in that cache, which every worker checks in the
+    same round-trip as the lookup itself. A worker that sees a generation
+    for the first time drops its own rule index (it may predate the
+    change), and only shares answers from an index built after that.
+    """
+
+    def __init__(self, max_entries=1000, shared_alias=None, timeout=3600):
+        self.max_entries = max_entries
+        self.shared_alias = shared_alias
+        self.timeout = timeout
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # The last shared generation this worker has seen, and when
+        self._generation = None
+        self._generation_seen_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def _shared(self):
+        return caches[self.shared_alias]
+
+    def _key(self, message):
+        return f'chatbot:response:{normalize_message(message)}'
+
+    def get(self, message):
+        """Returns the cached result dict, or None."""
+        key = self._key(message)
+        if self.shared_alias:
+            found = self._shared.get_many([GENERATION_KEY, key])
+            self._check_generation(found.get(GENERATION_KEY, 0))
+            return self._count(self._unpack_shared(found, key))
+        return self._count(self._get_local(key))
+
+    async def aget(self, message):
+        """Async version of get() for async views and consumers."""
+        key = self._key(message)
+        if self.shared_alias:
+            found = await self._shared.aget_many([GENERATION_KEY, key])
+            self._check_generation(found.get(GENERATION_KEY, 0))
+            return self._count(self._unpack_shared(found, key))
+        return self._count(self._get_local(key))
+
+    def set(self, message, result):
+        key = self._key(message)
+        if self.shared_alias:
+            generation = self._shared.get(GENERATION_KEY, 0)
+            if not self._check_generation(generation):
+                return
+            self._shared.set(key, (generation, result), self.timeout)
+        else:
+            self._set_local(key, result)
+
+    async def aset(self, message, result):
+        """Async version of set()."""
+        key = self._key(message)
+        if self.shared_alias:
+            generation = await self._shared.aget(GENERATION_KEY, 0)
+            if not self._check_generation(generation):
+                return
+            await self._shared.aset(key, (generation, result), self.timeout)
+        else:
+            self._set_local(key, result)
+
+    def _check_generation(self, generation):
+        """
+        Shared mode. A generation we haven't seen before means the rules
+        changed, maybe in another worker, where our signals never fired.
+        Our rule index may be older than that change, so drop it; the next
+        message rebuilds it. Returns True if the current index was built
+        after we learned of `generation`, i.e. its answers may be shared.
+        """
+        with self._lock:
+            changed = generation != self._generation
+            if changed:
+                self._generation = generation
+                self._generation_seen_at = time.monotonic()
+        if changed:
+            invalidate_rule_index()
+            return False
+        index = peek_rule_index()
+        return index is not None and index.built_at >= self._generation_seen_at
+
+    def _unpack_shared(self, found, key):
+        entry = found.get(key)
+        if entry and entry[0] == found.get(GENERATION_KEY, 0):
+            return entry[1]
+        return None
+
+    def _get_local(self, key):
+        # No index yet means nothing cached can be trusted;
+        # peek (rather than build) so this never hits the database
+        index = peek_rule_index()
+        if index is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == index.generation:
+                self._entries.move_to_end(key)
+                return entry[1]
+        return None
+
+    def _set_local(self, key, result):
+        index = peek_rule_index()
+        if index is None:
+            return
+        with self._lock:
+            self._entries[key] = (index.generation, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _count(self, result):
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def clear(self):
+        """Forgets every cached answer (in every worker, if shared)."""
+        with self._lock:
+            self._entries.clear()
+        if self.shared_alias:
+            shared = self._shared
+            shared.add(GENERATION_KEY, 0, None)
+            generation = shared.incr(GENERATION_KEY)
+            # This worker needs no rebuild for its own bump: the signal
+            # that clears us has already dropped the rule index
+            with self._lock:
+                self._generation = generation
+                self._generation_seen_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries),
+                'backend': self.shared_alias or 'local',
+            }
+
+
+# --- Process-wide cache ---
+response_cache = ResponseCache(
+    max_entries=getattr(settings, 'CHATBOT_RESPONSE_CACHE_SIZE', 1000),
+    shared_alias=getattr(settings, 'CHATBOT_RESPONSE_CACHE_ALIAS', None),
+)
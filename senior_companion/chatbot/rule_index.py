@@ -0,0 +1,223 @@
+import itertools
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+
+from .fuzzy_matcher import FuzzyMatcher
+from .keyword_matcher import KeywordMatcher
+from .models import LogicRule
+from .regex_matcher import RegexMatcher
+
+# A trimmed-down, read-only copy of a LogicRule.
+# We keep these instead of model instances so the index holds no ORM state.
+CompiledRule = namedtuple('CompiledRule', ['id', 'priority', 'response', 'link'])
+
+# Every RuleIndex gets a new number, so anything derived from an
+# old index (e.g. cached answers) can tell it's out of date.
+_generations = itertools.count(1)
+
+
+def _rank(rule):
+    """
+    Sort key for "which rule wins".
+    Higher priority first, then the older (lower id) rule.
+    """
+    return (-rule.priority, rule.id)
+
+
+class RuleIndex:
+    """
+    An in-memory, pre-compiled copy of every LogicRule.
+
+    It is built once from the database and then answers questions
+    without touching the database again:
+      - 'exact' rules live in a dict (one lookup).
+      - 'contains' rules are merged into one Aho-Corasick automaton,
+        so all keywords are found in a single pass over the message.
+      - 'regex' rules are compiled once, grouped by priority and merged
+        into alternations, and run under a per-message time budget.
+
+    It also carries a typo-tolerant index over the 'contains' and 'exact'
+    patterns, used by `fuzzy_match` when nothing matches exactly.
+    """
+
+    def __init__(self, rules):
+        self.exact = {}
+        self.by_id = {}
+        contains = []
+        regexes = []
+
+        for rule in rules:
+            compiled = CompiledRule(rule.id, rule.priority, rule.response, rule.suggested_link)
+            self.by_id[rule.id] = compiled
+            pattern = rule.pattern.lower().strip()
+
+            if rule.match_type == 'exact':
+                current = self.exact.get(pattern)
+                if current is None or _rank(compiled) < _rank(current):
+                    self.exact[pattern] = compiled
+
+            elif rule.match_type == 'contains':
+                contains.append((compiled, pattern))
+
+            elif rule.match_type == 'regex':
+                regexes.append((compiled, rule.pattern))
+
+        boundary = getattr(settings, 'CHATBOT_CONTAINS_BOUNDARY', 'substring')
+        self.keywords = KeywordMatcher(
+            ((pattern, compiled) for compiled, pattern in contains),
+            rank=_rank,
+            boundary=boundary,
+        )
+        self.regexes = RegexMatcher(
+            regexes,
+            rank=_rank,
+            budget=getattr(settings, 'CHATBOT_REGEX_TIME_BUDGET', 0.05),
+            on_slow=disable_slow_rule,
+        )
+        self.fuzzy = FuzzyMatcher(
+            keywords=((pattern, compiled) for compiled, pattern in contains),
+            phrases=self.exact.items(),
+            rank=_rank,
+            max_distance=getattr(settings, 'CHATBOT_FUZZY_MAX_DISTANCE', 2),
+        )
+        self.generation = next(_generations)
+        self.built_at = time.monotonic()
+        self.size = len(rules)
+
+    @classmethod
+    def from_database(cls):
+        return cls(list(LogicRule.objects.filter(is_active=True)))
+
+    def match(self, cleaned_input):
+        """
+        Returns the best CompiledRule for an already lower-cased,
+        stripped input, or None if nothing matches.
+        """
+        return self.regexes.search(cleaned_input, best=self.match_literal(cleaned_input))
+
+    def match_literal(self, cleaned_input):
+        """
+        The 'exact' and 'contains' part of match(). Linear in the message
+        whatever the rules, so it's safe on the event loop; a regex can
+        take any amount of time and isn't.
+        """
+        best = self.exact.get(cleaned_input)
+
+        keyword_rule = self.keywords.best(cleaned_input)
+        if keyword_rule is not None and (best is None or _rank(keyword_rule) < _rank(best)):
+            best = keyword_rule
+        return best
+
+    def fuzzy_match(self, cleaned_input):
+        """
+        Fallback for misspellings ("hospitel", "registr").
+        Returns the closest CompiledRule within the typo budget, or None.
+        """
+        rule, _distance = self.fuzzy.match(cleaned_input)
+        return rule
+
+
+# rule id -> when it recently blew the time budget (time.monotonic())
+_slow_strikes = {}
+_slow_lock = threading.Lock()
+
+
+def disable_slow_rule(rule, elapsed):
+    """
+    Called when a regex rule on its own blows the time budget.
+
+    One slow search proves little (a GC pause or a busy host will do it),
+    so we only act once the rule has been slow CHATBOT_REGEX_SLOW_STRIKES
+    times within CHATBOT_REGEX_SLOW_WINDOW seconds. Then the rule is
+    switched off so it shows up in the admin (filter by 'is active')
+    with the reason attached.
+
+    The database write happens on a background thread: we may be
+    running inside the event loop (ChatBotEngine.aprocess), and the
+    user shouldn't wait for it anyway.
+    """
+    needed = getattr(settings, 'CHATBOT_REGEX_SLOW_STRIKES', 3)
+    window = getattr(settings, 'CHATBOT_REGEX_SLOW_WINDOW', 600)
+    now = time.monotonic()
+
+    with _slow_lock:
+        strikes = [t for t in _slow_strikes.get(rule.id, ()) if now - t < window]
+        strikes.append(now)
+        if len(strikes) < needed:
+            _slow_strikes[rule.id] = strikes
+            print(f"!!! Chatbot regex rule #{rule.id} took {elapsed * 1000:.0f} ms ({len(strikes)} of {needed} strikes) !!!")
+            return
+        _slow_strikes.pop(rule.id, None)
+
+    print(f"!!! Chatbot regex rule #{rule.id} took {elapsed * 1000:.0f} ms, slow {needed} times, disabling it !!!")
+    reason = f"Disabled automatically: over the time budget {needed} times in {window} s (last time {elapsed * 1000:.0f} ms)."
+    threading.Thread(target=_save_disabled_rule, args=(rule.id, reason), daemon=True).start()
+
+
+def _save_disabled_rule(rule_id, reason):
+    try:
+        db_rule = LogicRule.objects.filter(pk=rule_id).first()
+        if db_rule is None:
+            return
+        db_rule.is_active = False
+        db_rule.disabled_reason = reason
+        # save() (not update()) so post_save drops the index and cached answers
+        db_rule.save(update_fields=['is_active', 'disabled_reason'])
+    except Exception as e:
+        print(f"!!! FAILED to disable chatbot rule #{rule_id}: {e} !!!")
+    finally:
+        connection.close()
+
+
+# --- Process-wide index ---
+# Built lazily on first use and thrown away whenever a LogicRule
+# changes (see chatbot/signals.py).
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_rule_index():
+    """
+    Returns the shared RuleIndex, building it if needed.
+
+    Signals only fire in the process that saved the rule, so the index
+    is also rebuilt after CHATBOT_RULE_INDEX_MAX_AGE seconds to pick up
+    changes made by other workers.
+    """
+    global _index
+    max_age = getattr(settings, 'CHATBOT_RULE_INDEX_MAX_AGE', 300)
+
+    index = _index
+    if index is not None and time.monotonic() - index.built_at < max_age:
+        return index
+
+    with _index_lock:
+        # Another thread may have rebuilt it while we waited
+        index = _index
+        if index is None or time.monotonic() - index.built_at >= max_age:
+            index = RuleIndex.from_database()
+            _index = index
+    return index
+
+
+def peek_rule_index():
+    """
+    Returns the shared RuleIndex if it's built and fresh, otherwise None.
+    Never touches the database, so it's safe to call from async code.
+    """
+    max_age = getattr(settings, 'CHATBOT_RULE_INDEX_MAX_AGE', 300)
+    index = _index
+    if index is not None and time.monotonic() - index.built_at < max_age:
+        return index
+    return None
+
+
+def invalidate_rule_index():
+    """Drops the shared index; the next message rebuilds it."""
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,213 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+from datetime import datetime
+
+import joblib
+import numpy as np
+from django.conf import settings
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .models import LogicRule, UnansweredQuery
+
+# --- Configuration ---
+VECTORIZER_FILE = 'vectorizer.joblib'
+META_FILE = 'meta.json'
+ARRAY_FILES = ('data', 'indices', 'indptr', 'rule_ids')
+
+
+def get_index_dir():
+    return getattr(settings, 'CHATBOT_SEMANTIC_INDEX_DIR', os.path.join(settings.BASE_DIR, 'ml_models', 'chatbot_tfidf'))
+
+
+def build_semantic_index(rule_index, output_dir=None):
+    """
+    Fits a TF-IDF model over every active rule (pattern + response) and
+    over resolved UnansweredQuery texts, and saves it to `output_dir`.
+
+    A resolved question has no answer of its own, so we run it through
+    `rule_index` (which by now should include the rule the admin added
+    for it) and, if a rule matches, use the question as an extra example
+    phrasing for that rule.
+
+    Running workers have the current index memory-mapped, so it's never
+    written over: each build goes into a new version directory, and only
+    once that is complete does `meta.json` get swapped (os.replace, which
+    is atomic) to point at it. A reader sees the old index or the new
+    one, never half of each.
+
+    Returns (number of documents, number of rules covered).
+    """
+    output_dir = output_dir or get_index_dir()
+
+    documents = []
+    rule_ids = []
+    for rule in LogicRule.objects.filter(is_active=True):
+        documents.append(f"{rule.pattern} {rule.response}")
+        rule_ids.append(rule.id)
+
+    resolved = UnansweredQuery.objects.filter(is_resolved=True).values_list('query_text', flat=True)
+    for text in resolved.iterator():
+        cleaned = text.lower().strip()
+        rule = rule_index.match(cleaned) or rule_index.fuzzy_match(cleaned)
+        if rule is not None:
+            documents.append(text)
+            rule_ids.append(rule.id)
+
+    if not documents:
+        raise ValueError("There are no active rules to index.")
+
+    vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, 2), sublinear_tf=True)
+    # Rows are L2-normalised, so a dot product is the cosine similarity
+    matrix = vectorizer.fit_transform(documents).tocsr().astype(np.float32)
+
+    # Sorts in build order (see _remove_old_versions)
+    version = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:8]}"
+    version_dir = os.path.join(output_dir, version)
+    os.makedirs(version_dir)
+    joblib.dump(vectorizer, os.path.join(version_dir, VECTORIZER_FILE))
+    arrays = {
+        'data': matrix.data,
+        'indices': matrix.indices,
+        'indptr': matrix.indptr,
+        'rule_ids': np.asarray(rule_ids, dtype=np.int64),
+    }
+    for name in ARRAY_FILES:
+        np.save(os.path.join(version_dir, f'{name}.npy'), arrays[name])
+
+    # Publish: write the new meta.json next to the old one, then swap it in
+    meta = {'version': version, 'shape': list(matrix.shape), 'documents': len(documents)}
+    meta_path = os.path.join(output_dir, META_FILE)
+    temp_path = f'{meta_path}.{uuid.uuid4().hex}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(meta, f)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.replace(temp_path, meta_path)
+    except OSError:
+        os.remove(temp_path)
+        raise
+
+    _remove_old_versions(output_dir, keep=version)
+    return len(documents), len(set(rule_ids))
+
+
+def _remove_old_versions(output_dir, keep, spare=1):
+    """
+    Deletes old version directories, except `keep` and the `spare` newest
+    others (a worker may have read the old meta.json and still be loading
+    that version). Workers that already mapped an older one keep their
+    pages until they reload; on Windows, where mapped files can't be
+    deleted, those directories are just left for the next build.
+    """
+    old = sorted(
+        (name for name in os.listdir(output_dir)
+         if name != keep and os.path.isfile(os.path.join(output_dir, name, VECTORIZER_FILE))),
+        reverse=True,
+    )
+    for name in old[spare:]:
+        shutil.rmtree(os.path.join(output_dir, name), ignore_errors=True)
+
+
+class SemanticIndex:
+    """
+    A TF-IDF nearest-neighbour lookup over rule texts.
+
+    The matrix arrays are memory-mapped, so every worker process shares
+    the same pages through the OS cache instead of holding its own copy.
+    """
+
+    def __init__(self, vectorizer, matrix, rule_ids):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.rule_ids = rule_ids
+
+    @classmethod
+    def load(cls, index_dir):
+        """Loads the version `meta.json` points at (files never change once published)."""
+        with open(os.path.join(index_dir, META_FILE)) as f:
+            meta = json.load(f)
+        version_dir = os.path.join(index_dir, meta['version'])
+        vectorizer = joblib.load(os.path.join(version_dir, VECTORIZER_FILE))
+        arrays = {
+            name: np.load(os.path.join(version_dir, f'{name}.npy'), mmap_mode='r')
+            for name in ARRAY_FILES
+        }
+        matrix = csr_matrix(
+            (arrays['data'], arrays['indices'], arrays['indptr']),
+            shape=tuple(meta['shape']),
+            copy=False,
+        )
+        return cls(vectorizer, matrix, arrays['rule_ids'])
+
+    def nearest(self, text, limit=5):
+        """Returns up to `limit` (rule id, score) pairs, best first."""
+        query = self.vectorizer.transform([text])
+        if not query.nnz:
+            return []
+        scores = (self.matrix @ query.T).toarray().ravel()
+        if len(scores) > limit:
+            top = np.argpartition(scores, -limit)[-limit:]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.rule_ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+# --- Process-wide index ---
+# Loaded on first use and reloaded when build_chatbot_index publishes a new one.
+_semantic = None
+_semantic_stamp = None
+_semantic_lock = threading.Lock()
+
+
+def get_semantic_index():
+    """Returns the saved SemanticIndex, or None if it hasn't been built yet."""
+    global _semantic, _semantic_stamp
+    index_dir = get_index_dir()
+    try:
+        stat = os.stat(os.path.join(index_dir, META_FILE))
+    except OSError:
+        return None
+    # Every publish replaces meta.json with a new file (new inode), even
+    # when two builds land within the filesystem's mtime resolution
+    stamp = (stat.st_ino, stat.st_mtime_ns)
+
+    if _semantic_stamp == stamp:
+        return _semantic
+
+    with _semantic_lock:
+        if _semantic_stamp != stamp:
+            try:
+                _semantic = SemanticIndex.load(index_dir)
+            except Exception as e:
+                # e.g. an index from before versioning; run build_chatbot_index.
+                # Don't retry until a new one is published.
+                print(f"!!! FAILED to load chatbot semantic index from {index_dir}: {e} !!!")
+                _semantic = None
+            _semantic_stamp = stamp
+    return _semantic
+
+
+def semantic_match(cleaned_input, rule_index):
+    """
+    Last-resort lookup: the rule whose text is most similar to the message,
+    if the similarity clears CHATBOT_SEMANTIC_THRESHOLD. Rules that were
+    deleted or disabled since the index was built are skipped.
+    """
+    semantic = get_semantic_index()
+    if semantic is None:
+        return None
+
+    threshold = getattr(settings, 'CHATBOT_SEMANTIC_THRESHOLD', 0.35)
+    for rule_id, score in semantic.nearest(cleaned_input):
+        if score < threshold:
+            break
+        rule = rule_index.by_id.get(rule_id)
+        if rule is not None:
+            return rule
+    return None
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import LogicRule
+from .response_cache import response_cache
+from .rule_index import invalidate_rule_index
+
+@receiver(post_save, sender=LogicRule)
+@receiver(post_delete, sender=LogicRule)
+def rebuild_rule_index(sender, **kwargs):
+    """
+    When a rule is added, edited or deleted,
+    throw away the compiled rule index so the
+    next chat message rebuilds it from the database,
+    along with any answers cached from the old rules.
+    """
+    invalidate_rule_index()
+    response_cache.clear()
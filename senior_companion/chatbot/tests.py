@@ -1,3 +1,591 @@
-from django.test import TestCase
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from chat.routing import websocket_urlpatterns
+
+from . import fuzzy_matcher, logic_engine, rule_index, semantic_index
+from .fuzzy_matcher import FuzzyMatcher
+from .keyword_matcher import BOUNDARY_MODES, KeywordMatcher
+from .models import LogicRule, UnansweredQuery
+from .regex_matcher import RegexMatcher
+from .response_cache import ResponseCache
+from .unanswered_log import UnansweredQueryBuffer
+
+# Stand-in for rule_index.CompiledRule: all the matchers look at
+Rule = namedtuple('Rule', ['id', 'priority'])
+
+
+def rank(rule):
+    # Same order as rule_index._rank: higher priority, then lower id
+    return (-rule.priority, rule.id)
+
+
+def is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+
+def brute_force_best(keywords, text, boundary):
+    """What KeywordMatcher.best must return: try every keyword at every position."""
+    best = None
+    for pattern, rule in keywords:
+        start = text.find(pattern)
+        while start != -1:
+            end = start + len(pattern)
+            starts_word = start == 0 or not is_word_char(text[start - 1])
+            ends_word = end == len(text) or not is_word_char(text[end])
+            if (
+                boundary == 'substring'
+                or (boundary == 'prefix' and starts_word)
+                or (boundary == 'word' and starts_word and ends_word)
+            ):
+                if best is None or rank(rule) < rank(best):
+                    best = rule
+            start = text.find(pattern, start + 1)
+    return best
+
+
+class KeywordMatcherTests(SimpleTestCase):
+
+    def test_matches_brute_force_on_random_overlapping_keywords(self):
+        rng = random.Random(7)
+        for boundary in BOUNDARY_MODES:
+            for _ in range(50):
+                # A tiny alphabet, so keywords overlap, nest and repeat a lot;
+                # few priorities, so most decisions are ties broken by id
+                keywords = [
+                    (''.join(rng.choices('ab ', k=rng.randint(1, 4))), Rule(i, rng.randint(1, 3)))
+                    for i in range(rng.randint(1, 15))
+                ]
+                keywords = [(pattern, rule) for pattern, rule in keywords if pattern.strip()]
+                matcher = KeywordMatcher(keywords, rank=rank, boundary=boundary)
+                for _ in range(20):
+                    text = ''.join(rng.choices('ab _', k=rng.randint(0, 20)))
+                    with self.subTest(boundary=boundary, keywords=keywords, text=text):
+                        self.assertEqual(matcher.best(text), brute_force_best(keywords, text, boundary))
+
+    def test_overlapping_keywords(self):
+        keywords = [
+            ('he', Rule(1, 1)),
+            ('she', Rule(2, 5)),
+            ('hers', Rule(3, 3)),
+            ('his', Rule(4, 9)),
+        ]
+        for boundary, text, expected in [
+            ('substring', 'ushers', Rule(2, 5)),  # 'she', 'he' and 'hers' all end inside
+            ('prefix', 'ushers', None),          # ...but none starts a word
+            ('prefix', 'hers now', Rule(3, 3)),
+            ('word', 'hers now', Rule(3, 3)),     # 'he' is only a prefix of 'hers'
+            ('word', 'she and he', Rule(2, 5)),
+        ]:
+            with self.subTest(boundary=boundary, text=text):
+                matcher = KeywordMatcher(keywords, rank=rank, boundary=boundary)
+                self.assertEqual(matcher.best(text), expected)
+                self.assertEqual(matcher.best(text), brute_force_best(keywords, text, boundary))
+
+    def test_rank_ties(self):
+        # Same priority: the older (lower id) rule wins wherever it appears
+        keywords = [('pill', Rule(9, 2)), ('doctor', Rule(4, 2))]
+        matcher = KeywordMatcher(keywords, rank=rank)
+        self.assertEqual(matcher.best('pill then doctor'), Rule(4, 2))
+
+        # The same keyword twice keeps the better-ranked rule, whichever came first
+        for keywords in ([('pill', Rule(9, 2)), ('pill', Rule(4, 2))], [('pill', Rule(4, 2)), ('pill', Rule(9, 2))]):
+            matcher = KeywordMatcher(keywords, rank=rank)
+            self.assertEqual(len(matcher), 1)
+            self.assertEqual(matcher.best('my pill'), Rule(4, 2))
+
+    def test_find_all_reports_every_occurrence(self):
+        matcher = KeywordMatcher([('ab', Rule(1, 1)), ('b', Rule(2, 1))], rank=rank)
+        self.assertEqual(
+            list(matcher.find_all('abab')),
+            [(0, 2, Rule(1, 1)), (1, 2, Rule(2, 1)), (2, 4, Rule(1, 1)), (3, 4, Rule(2, 1))],
+        )
+
+    def test_unknown_boundary_mode(self):
+        with self.assertRaises(ValueError):
+            KeywordMatcher([], rank=rank, boundary='sentence')
+
+
+def one_by_one(rules, text):
+    """What RegexMatcher.search must return: the old loop over rules in rank order."""
+    for rule, pattern in sorted(rules, key=lambda item: rank(item[0])):
+        if re.search(pattern, text, re.IGNORECASE):
+            return rule
+    return None
+
+
+class RegexMatcherTests(SimpleTestCase):
+    PATTERNS = [r'a+b', r'ab?a', r'(a|b)b', r'^a', r'b$', r'\bab', r'ba*', r'a{2,}', r'(?:ab)+a', r'b\s+a', r'a\d', r'(?<=b)a']
+
+    def test_merged_groups_pick_the_same_rule_as_the_old_loop(self):
+        rng = random.Random(3)
+        for _ in range(200):
+            rules = [
+                (Rule(i, rng.randint(1, 2)), rng.choice(self.PATTERNS))
+                for i in range(rng.randint(1, 8))
+            ]
+            matcher = RegexMatcher(rules, rank=rank, budget=10)
+            for _ in range(10):
+                text = ''.join(rng.choices('ab 1', k=rng.randint(0, 12)))
+                with self.subTest(rules=rules, text=text):
+                    self.assertEqual(matcher.search(text), one_by_one(rules, text))
+
+    def test_best_ranked_rule_wins_not_leftmost_match(self):
+        rules = [(Rule(1, 5), r'doctor'), (Rule(2, 5), r'pill')]
+        matcher = RegexMatcher(rules, rank=rank, budget=10)
+        # Both share one combined regex; 'pill' matches first in the text,
+        # but rule 1 is older so it wins
+        self.assertEqual(len(matcher._groups[0][1]), 1)
+        self.assertEqual(matcher.search('my pill, my doctor'), Rule(1, 5))
+
+    def test_slow_rule_is_reported_but_kept(self):
+        slow = []
+        rules = [(Rule(1, 5), r'doctor')]
+        matcher = RegexMatcher(rules, rank=rank, budget=-1, on_slow=lambda rule, elapsed: slow.append(rule))
+        with mock.patch('builtins.print'):
+            self.assertEqual(matcher.search('doctor'), Rule(1, 5))
+            self.assertEqual(matcher.search('doctor'), Rule(1, 5))
+        self.assertEqual(slow, [Rule(1, 5), Rule(1, 5)])
+
+    def test_slow_combined_group_is_split_before_blaming_a_rule(self):
+        slow = []
+        rules = [(Rule(1, 5), r'doctor'), (Rule(2, 5), r'pill')]
+        matcher = RegexMatcher(rules, rank=rank, budget=-1, on_slow=lambda rule, elapsed: slow.append(rule))
+        with mock.patch('builtins.print'):
+            matcher.search('pill')
+        self.assertEqual(slow, [])
+        self.assertEqual(len(matcher._groups[0][1]), 2)
+
+
+@override_settings(CHATBOT_REGEX_SLOW_STRIKES=3, CHATBOT_REGEX_SLOW_WINDOW=60)
+@mock.patch('builtins.print')
+@mock.patch('chatbot.rule_index.threading.Thread')
+class DisableSlowRuleTests(SimpleTestCase):
+
+    def setUp(self):
+        rule_index._slow_strikes.clear()
+
+    def strike(self, at):
+        with mock.patch('chatbot.rule_index.time.monotonic', return_value=at):
+            rule_index.disable_slow_rule(Rule(1, 5), 0.2)
+
+    def test_one_slow_search_does_not_disable_the_rule(self, thread, _print):
+        self.strike(0)
+        self.strike(10)
+        thread.assert_not_called()
+
+        self.strike(20)
+        thread.assert_called_once()
+        self.assertEqual(thread.call_args.kwargs['args'][0], 1)
+
+    def test_strikes_outside_the_window_are_forgotten(self, thread, _print):
+        self.strike(0)
+        self.strike(50)
+        self.strike(100)  # the first strike is too old by now
+        thread.assert_not_called()
+        self.strike(105)
+        thread.assert_called_once()
+
+
+@mock.patch.object(UnansweredQueryBuffer, '_ensure_worker')  # flush by hand, no thread
+class UnansweredQueryBufferTests(TestCase):
+
+    def test_repeat_of_an_existing_question_in_other_case_bumps_its_row(self, _worker):
+        row = UnansweredQuery.objects.create(query_text='Where is the BUS stop?', last_seen=timezone.now())
+
+        buffer = UnansweredQueryBuffer()
+        buffer.add('where is the bus stop?')
+        buffer.add('  WHERE is the bus stop?')
+        buffer.flush()
+
+        self.assertEqual(UnansweredQuery.objects.count(), 1)
+        row.refresh_from_db()
+        self.assertEqual(row.hit_count, 3)
+
+    def test_failed_write_is_retried_on_the_next_flush(self, _worker):
+        buffer = UnansweredQueryBuffer()
+        buffer.add('how do i knit')
+        buffer.add('how do i knit')
+
+        with mock.patch.object(UnansweredQuery.objects, 'bulk_create', side_effect=RuntimeError('database is down')):
+            with self.assertRaises(RuntimeError):
+                buffer.flush()
+        self.assertFalse(UnansweredQuery.objects.exists())
+
+        # Asked again while the database was down
+        buffer.add('How do I knit')
+        buffer.flush()
+
+        row = UnansweredQuery.objects.get()
+        self.assertEqual(row.query_text, 'how do i knit')
+        self.assertEqual(row.hit_count, 3)
+
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def brute_force_fuzzy(matcher, keywords, phrases, text):
+    """What FuzzyMatcher.match must return: every pattern against every candidate."""
+    words = re.findall(r'\w+', text)
+    candidates = [(text, phrases)]
+    for size in {len(pattern.split()) for pattern, _rule in keywords}:
+        candidates += [(' '.join(words[i:i + size]), keywords) for i in range(len(words) - size + 1)]
+
+    best_key = best = None
+    for candidate, patterns in candidates:
+        for pattern, rule in patterns:
+            limit = matcher.allowed_distance(len(pattern))
+            distance = levenshtein(candidate, pattern)
+            if limit and distance <= limit and (best_key is None or (distance, rank(rule)) < best_key):
+                best_key, best = (distance, rank(rule)), rule
+    return (best, best_key[0]) if best is not None else (None, None)
+
+
+class FuzzyMatcherTests(SimpleTestCase):
+
+    def typo(self, rng, word):
+        i = rng.randrange(len(word))
+        return rng.choice([
+            word[:i] + word[i + 1:],                      # dropped letter
+            word[:i] + rng.choice('abc') + word[i + 1:],  # wrong letter
+            word[:i] + rng.choice('abc') + word[i:],      # extra letter
+        ])
+
+    def test_matches_brute_force(self):
+        rng = random.Random(11)
+        word = lambda: ''.join(rng.choices('abc', k=rng.randint(3, 9)))
+        for _ in range(40):
+            keywords = [(' '.join(word() for _ in range(rng.randint(1, 2))), Rule(i, rng.randint(1, 2))) for i in range(6)]
+            phrases = [(' '.join(word() for _ in range(rng.randint(2, 3))), Rule(100 + i, rng.randint(1, 2))) for i in range(4)]
+            matcher = FuzzyMatcher(keywords, phrases, rank=rank)
+            for _ in range(15):
+                source = rng.choice(keywords + phrases)[0]
+                text = ' '.join([word(), self.typo(rng, source), word()] if rng.random() < 0.5 else [self.typo(rng, source)])
+                with self.subTest(keywords=keywords, phrases=phrases, text=text):
+                    self.assertEqual(matcher.match(text), brute_force_fuzzy(matcher, keywords, phrases, text))
+
+    def test_typos_and_short_words(self):
+        matcher = FuzzyMatcher(
+            keywords=[('hospital', Rule(1, 1)), ('pill', Rule(2, 1)), ('doctor', Rule(3, 1))],
+            phrases=[('how do i register', Rule(4, 1))],
+            rank=rank,
+        )
+        self.assertEqual(matcher.match('nearest hospitel please'), (Rule(1, 1), 1))
+        self.assertEqual(matcher.match('docter visit'), (Rule(3, 1), 1))
+        self.assertEqual(matcher.match('how do i registr'), (Rule(4, 1), 1))
+        # Short words must be spelled right
+        self.assertEqual(matcher.match('my pull'), (None, None))
+        # 'doctor' allows only one typo
+        self.assertEqual(matcher.match('dictar'), (None, None))
+
+    def test_fewer_typos_beat_priority(self):
+        matcher = FuzzyMatcher(
+            keywords=[('hospital', Rule(1, 9)), ('hospice', Rule(2, 1))],
+            phrases=[],
+            rank=rank,
+        )
+        # One typo from 'hospice', two from the higher-priority 'hospital'
+        self.assertEqual(matcher.match('hospise'), (Rule(2, 1), 1))
+
+    def test_each_candidate_pattern_is_verified_once(self):
+        matcher = FuzzyMatcher(keywords=[('hospital', Rule(1, 1))], phrases=[], rank=rank)
+        with mock.patch.object(fuzzy_matcher, 'edit_distance', wraps=fuzzy_matcher.edit_distance) as edit_distance:
+            self.assertEqual(matcher.match('hospitel'), (Rule(1, 1), 1))
+        # 'hospitel' reaches 'hospital' through many deletion variants
+        # ('hospitl', 'hospit', 'hosptl'...), but one check is enough
+        self.assertEqual(edit_distance.call_count, 1)
+
+    def test_long_message_is_not_compared_with_short_phrases(self):
+        matcher = FuzzyMatcher(
+            keywords=[('prescription refill', Rule(1, 1))],
+            phrases=[('good morning', Rule(2, 1))],
+            rank=rank,
+        )
+        message = 'where is my refil'
+        with mock.patch.object(fuzzy_matcher, '_deletes', wraps=fuzzy_matcher._deletes) as deletes:
+            matcher.match(message)
+        # Too long to be 'good morning' with two typos, so its (many)
+        # deletion variants shouldn't even be generated
+        self.assertNotIn(message, [call.args[0] for call in deletes.call_args_list])
+
+
+class SemanticIndexPublishTests(TestCase):
+
+    def setUp(self):
+        LogicRule.objects.create(pattern='bus timetable', match_type='contains', response='Buses leave every hour.')
+        LogicRule.objects.create(pattern='yoga class', match_type='contains', response='Yoga is on Tuesdays.')
+        temp = tempfile.TemporaryDirectory()
+        self.addCleanup(temp.cleanup)
+        self.index_dir = temp.name
+
+        # A fresh process-wide index for each test
+        self.addCleanup(setattr, semantic_index, '_semantic', None)
+        self.addCleanup(setattr, semantic_index, '_semantic_stamp', None)
+        semantic_index._semantic = semantic_index._semantic_stamp = None
+
+    def build(self):
+        semantic_index.build_semantic_index(rule_index.RuleIndex.from_database(), self.index_dir)
+
+    def versions(self):
+        return sorted(name for name in os.listdir(self.index_dir) if name != semantic_index.META_FILE)
+
+    def stamps(self, directory):
+        return {name: os.stat(os.path.join(directory, name)).st_mtime_ns for name in os.listdir(directory)}
+
+    def test_rebuild_never_touches_the_published_files(self):
+        with override_settings(CHATBOT_SEMANTIC_INDEX_DIR=self.index_dir):
+            self.build()
+            first = semantic_index.get_semantic_index()
+            old_dir = os.path.join(self.index_dir, self.versions()[0])
+            first_files = self.stamps(old_dir)
+
+            LogicRule.objects.create(pattern='library hours', match_type='contains', response='Open 9 to 5.')
+            self.build()
+
+            # The old version is still on disk, unchanged, and still answers
+            self.assertEqual(len(self.versions()), 2)
+            self.assertEqual(self.stamps(old_dir), first_files)
+            self.assertTrue(first.nearest('bus timetable'))
+
+            # ...and the next lookup switches to the new one
+            second = semantic_index.get_semantic_index()
+            self.assertIsNot(second, first)
+            self.assertEqual(second.matrix.shape[0], 3)
+
+    def test_old_versions_are_cleaned_up(self):
+        for _ in range(4):
+            self.build()
+        # The published version plus one spare
+        self.assertEqual(len(self.versions()), 2)
+        with open(os.path.join(self.index_dir, semantic_index.META_FILE)) as f:
+            self.assertIn(json.load(f)['version'], self.versions())
+
+    def test_meta_is_replaced_not_rewritten(self):
+        self.build()
+        with mock.patch('chatbot.semantic_index.os.replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.build()
+        # The failed build never got published; readers still load the first
+        with override_settings(CHATBOT_SEMANTIC_INDEX_DIR=self.index_dir):
+            self.assertEqual(semantic_index.get_semantic_index().matrix.shape[0], 2)
+
+
+ANSWER = {'response': 'Buses leave every hour.', 'link': None, 'found': True}
+
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'chatbot_test': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'chatbot-test'},
+}
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        rule_index.invalidate_rule_index()
+        self.addCleanup(rule_index.invalidate_rule_index)
+
+    def test_normalized_questions_share_an_entry(self):
+        rule_index.get_rule_index()
+        cache = ResponseCache()
+        cache.set('  When is the BUS ', ANSWER)
+        self.assertEqual(cache.get('when is the bus'), ANSWER)
+
+    def test_rebuilt_rule_index_invalidates_local_answers(self):
+        rule_index.get_rule_index()
+        cache = ResponseCache()
+        cache.set('when is the bus', ANSWER)
+
+        rule_index.invalidate_rule_index()
+        # No index yet: nothing cached can be trusted
+        self.assertIsNone(cache.get('when is the bus'))
+        # A new index has a new generation, so the old answer stays dead
+        rule_index.get_rule_index()
+        self.assertIsNone(cache.get('when is the bus'))
+
+    def test_saving_a_rule_invalidates_cached_answers(self):
+        rule = LogicRule.objects.create(pattern='bus', match_type='contains', response='Buses leave every hour.')
+        rule_index.get_rule_index()
+        cache = ResponseCache()
+        cache.set('when is the bus', ANSWER)
+        self.assertEqual(cache.get('when is the bus'), ANSWER)
+
+        rule.response = 'Buses leave every 30 minutes.'
+        rule.save()  # post_save drops the index
+        rule_index.get_rule_index()
+        self.assertIsNone(cache.get('when is the bus'))
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_clear_invalidates_shared_answers_in_every_worker(self):
+        caches['chatbot_test'].clear()
+        worker_a = ResponseCache(shared_alias='chatbot_test')
+        worker_b = ResponseCache(shared_alias='chatbot_test')
+        # As in answer_message: look up, build the index, then store
+        self.assertIsNone(worker_a.get('when is the bus'))
+        rule_index.get_rule_index()
+        worker_a.set('when is the bus', ANSWER)
+        self.assertEqual(worker_b.get('when is the bus'), ANSWER)
+
+        worker_b.clear()
+        self.assertIsNone(worker_a.get('when is the bus'))
+        self.assertEqual(worker_a.stats()['misses'], 2)  # before and after the clear
+
+
+    @override_settings(CACHES=SHARED_CACHES)
+    async def test_worker_with_a_stale_index_does_not_share_old_answers(self):
+        caches['chatbot_test'].clear()
+        rule = await LogicRule.objects.acreate(pattern='bus', match_type='contains', response='OLD answer')
+        cache = ResponseCache(shared_alias='chatbot_test')
+        with mock.patch.object(logic_engine, 'response_cache', cache):
+            self.assertEqual((await logic_engine.answer_message('when is the bus'))['response'], 'OLD answer')
+
+            # Another worker edits the rule: its signal bumps the shared
+            # generation, but our in-memory index still has the old rule
+            await LogicRule.objects.filter(pk=rule.pk).aupdate(response='NEW answer')
+            await sync_to_async(ResponseCache(shared_alias='chatbot_test').clear)()
+
+            result = await logic_engine.answer_message('what about the bus')
+            self.assertEqual(result['response'], 'NEW answer')
+            self.assertEqual((await logic_engine.answer_message('when is the bus'))['response'], 'NEW answer')
+
+        fresh_worker = ResponseCache(shared_alias='chatbot_test')
+        self.assertEqual((await fresh_worker.aget('what about the bus'))['response'], 'NEW answer')
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_answer_from_before_a_generation_bump_is_not_stored(self):
+        caches['chatbot_test'].clear()
+        cache = ResponseCache(shared_alias='chatbot_test')
+        cache.get('when is the bus')
+        rule_index.get_rule_index()
+
+        ResponseCache(shared_alias='chatbot_test').clear()  # another worker
+        cache.set('when is the bus', ANSWER)  # computed with our old index
+        self.assertIsNone(ResponseCache(shared_alias='chatbot_test').get('when is the bus'))
+        self.assertIsNone(rule_index.peek_rule_index())
+
+
+class AsyncEngineTests(SimpleTestCase):
+
+    def setUp(self):
+        # An empty, already built index, so nothing matches in memory
+        rule_index._index = rule_index.RuleIndex([])
+        self.addCleanup(rule_index.invalidate_rule_index)
+
+    async def test_blocking_tiers_run_off_the_event_loop(self):
+        loop_thread = threading.get_ident()
+        threads = {}
+
+        def semantic_match(cleaned_input, index):
+            threads['semantic'] = threading.get_ident()
+            return None
+
+        def add(text, user_id=None):
+            threads['log'] = threading.get_ident()
+
+        with mock.patch.object(logic_engine, 'semantic_match', semantic_match), \
+                mock.patch.object(logic_engine.unanswered_buffer, 'add', add):
+            result = await logic_engine.ChatBotEngine().aprocess('what is the meaning of life')
+
+        self.assertFalse(result['found'])
+        self.assertEqual(set(threads), {'semantic', 'log'})
+        self.assertNotIn(loop_thread, threads.values())
+
+    async def test_regex_rules_run_off_the_event_loop(self):
+        rule_index._index = rule_index.RuleIndex([
+            LogicRule(id=1, pattern=r'\bbus(es)?\b', match_type='regex', priority=0, response='Buses leave every hour.'),
+        ])
+        loop_thread = threading.get_ident()
+        search = RegexMatcher.search
+        threads = []
+
+        def recording_search(matcher, text, best=None):
+            threads.append(threading.get_ident())
+            return search(matcher, text, best=best)
+
+        with mock.patch.object(RegexMatcher, 'search', recording_search):
+            result = await logic_engine.ChatBotEngine().aprocess('when do the buses come')
+
+        self.assertEqual(result['response'], 'Buses leave every hour.')
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], loop_thread)
+
+
+@override_settings(CHATBOT_WS_MAX_MESSAGE_LENGTH=50, CHATBOT_WS_MAX_MESSAGES=3, CHATBOT_WS_WINDOW=60)
+class BotConsumerTests(TestCase):
+
+    def setUp(self):
+        # Saving a rule drops the index and any cached answers
+        LogicRule.objects.create(pattern='bus', match_type='contains', response='Buses leave every hour.')
+        self.addCleanup(rule_index.invalidate_rule_index)
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/bot/ws/')
+        communicator.scope['user'] = AnonymousUser()
+        connected, _code = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_answer_echoes_the_question_id(self):
+        bot = await self.connect()
+        await bot.send_json_to({'id': 7, 'message': 'When is the BUS?'})
+        self.assertEqual(await bot.receive_json_from(), {
+            'status': 'success',
+            'id': 7,
+            'response': 'Buses leave every hour.',
+            'link': None,
+        })
+        await bot.disconnect()
+
+    async def test_over_length_frame_is_refused(self):
+        bot = await self.connect()
+        await bot.send_json_to({'id': 1, 'message': 'bus ' * 100})
+        self.assertEqual(await bot.receive_json_from(), {'status': 'error', 'message': 'Your message is too long.'})
+        await bot.disconnect()
+
+    async def test_malformed_and_non_object_json_is_refused(self):
+        bot = await self.connect()
+        for frame in ('not json', '[1, 2]', '"bus"'):
+            await bot.send_to(text_data=frame)
+            self.assertEqual(await bot.receive_json_from(), {'status': 'error', 'message': "Sorry, I couldn't read that message."})
+        await bot.disconnect()
+
+    async def test_messages_over_the_limit_are_refused_until_the_window_ends(self):
+        bot = await self.connect()
+        for i in range(3):
+            await bot.send_json_to({'id': i, 'message': 'bus'})
+            self.assertEqual((await bot.receive_json_from())['status'], 'success')
+
+        await bot.send_json_to({'id': 3, 'message': 'bus'})
+        self.assertEqual(await bot.receive_json_from(), {
+            'status': 'error',
+            'message': "You're sending messages too quickly. Please wait a moment.",
+        })
+
+        # A minute later (only the consumer's clock moves)
+        later = time.monotonic() + 61
+        with mock.patch('chatbot.consumers.time') as clock:
+            clock.monotonic.return_value = later
+            await bot.send_json_to({'id': 4, 'message': 'bus'})
+            self.assertEqual((await bot.receive_json_from())['id'], 4)
+        await bot.disconnect()
@@ -0,0 +1,165 @@
+import atexit
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Lower, Trim
+from django.utils import timezone
+
+from .models import UnansweredQuery
+
+
+class UnansweredQueryBuffer:
+    """
+    Collects questions the bot couldn't answer and writes them to the
+    database in batches from a background thread, so the chat request
+    never waits for an INSERT.
+
+    Repeats of the same question (ignoring case and surrounding spaces)
+    are folded into one row: inside a batch they are counted in memory,
+    and across batches they bump `hit_count` on the existing unresolved
+    row if it was last seen within the dedup window.
+    """
+
+    def __init__(self, batch_size=50, flush_interval=5.0, dedup_window=3600):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dedup_window = dedup_window
+
+        self._pending = {}  # normalized text -> entry dict
+        self._hits = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def normalize(text):
+        return text.lower().strip()
+
+    def add(self, text, user_id=None):
+        key = self.normalize(text)
+        now = timezone.now()
+
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = {
+                    'text': text,
+                    'user_id': user_id,
+                    'count': 1,
+                    'last_seen': now,
+                }
+            else:
+                entry['count'] += 1
+                entry['last_seen'] = now
+            self._hits += 1
+            full = self._hits >= self.batch_size
+
+        self._ensure_worker()
+        if full:
+            self._wake.set()
+
+    def _ensure_worker(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chatbot-unanswered-log', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"!!! FAILED to save unanswered chatbot queries, will retry: {e} !!!")
+            finally:
+                # This thread holds its own DB connection; don't keep it open between flushes
+                connection.close()
+
+    def flush(self):
+        """
+        Writes everything collected so far. Safe to call from any thread.
+        If the write fails, the questions go back in the buffer for the
+        next flush (and the error is raised).
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._hits = 0
+
+        if not pending:
+            return 0
+
+        try:
+            self._write(pending)
+        except Exception:
+            self._requeue(pending)
+            raise
+        return len(pending)
+
+    def _requeue(self, pending):
+        """Puts unsaved entries back, merged with anything added since."""
+        with self._lock:
+            for key, entry in pending.items():
+                current = self._pending.get(key)
+                if current is not None:
+                    entry['count'] += current['count']
+                    entry['last_seen'] = max(entry['last_seen'], current['last_seen'])
+                self._pending[key] = entry
+            self._hits = sum(entry['count'] for entry in self._pending.values())
+
+    def _write(self, pending):
+        cutoff = timezone.now() - timedelta(seconds=self.dedup_window)
+
+        with transaction.atomic():
+            # Recent unresolved rows for the same questions get their counter
+            # bumped. Compare normalized text, as the buffer keys are, so
+            # "Where is the bus?" finds an old "where is the bus?" row.
+            existing = {}
+            recent = UnansweredQuery.objects.annotate(
+                normalized=Trim(Lower('query_text')),
+            ).filter(
+                is_resolved=False,
+                normalized__in=pending.keys(),
+                last_seen__gte=cutoff,
+            ).order_by('-last_seen')
+            for row in recent:
+                existing.setdefault(row.normalized, row)
+
+            new_rows = []
+            for key, entry in pending.items():
+                row = existing.get(key)
+                if row is not None:
+                    UnansweredQuery.objects.filter(pk=row.pk).update(
+                        hit_count=F('hit_count') + entry['count'],
+                        last_seen=entry['last_seen'],
+                    )
+                else:
+                    new_rows.append(UnansweredQuery(
+                        user_id=entry['user_id'],
+                        query_text=entry['text'],
+                        hit_count=entry['count'],
+                        last_seen=entry['last_seen'],
+                    ))
+            UnansweredQuery.objects.bulk_create(new_rows)
+
+
+# --- Process-wide buffer ---
+unanswered_buffer = UnansweredQueryBuffer(
+    batch_size=getattr(settings, 'CHATBOT_UNANSWERED_BATCH_SIZE', 50),
+    flush_interval=getattr(settings, 'CHATBOT_UNANSWERED_FLUSH_INTERVAL', 5.0),
+    dedup_window=getattr(settings, 'CHATBOT_UNANSWERED_DEDUP_WINDOW', 3600),
+)
+
+
+@atexit.register
+def _flush_on_exit():
+    # Don't lose the last few questions when the worker shuts down
+    try:
+        unanswered_buffer.flush()
+    except Exception as e:
+        print(f"!!! FAILED to save unanswered chatbot queries on exit: {e} !!!")
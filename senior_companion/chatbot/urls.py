@@ -3,4 +3,5 @@ from . import views
 
 urlpatterns = [
     path('ask/', views.chat_api, name='chat_api'),
+    path('stats/', views.chat_api_stats, name='chat_api_stats'),
 ]
\ No newline at end of file
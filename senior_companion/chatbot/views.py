@@ -1,23 +1,26 @@
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
-from .logic_engine import ChatBotEngine
+from .logic_engine import answer_message
+from .response_cache import response_cache
+from resources.views import staff_required
 import json
 
 @require_POST
-def chat_api(request):
+async def chat_api(request):
     """
     API Endpoint that receives a JSON message and returns a JSON response.
+
+    This is an async view: Daphne runs it straight on the event loop
+    (no thread-pool hop), and answering never makes a sync DB call.
     """
     try:
         data = json.loads(request.body)
         user_message = data.get('message', '')
         
-        # Initialize our Logic Brain
-        bot = ChatBotEngine()
-        
-        # Get the answer
-        result = bot.process(user_message, user=request.user)
+        # Get the answer (cache first, then our Logic Brain).
+        # The user is only looked up if the question goes unanswered.
+        result = await answer_message(user_message, user=request.auser)
         
         return JsonResponse({
             'status': 'success',
@@ -26,4 +29,13 @@ def chat_api(request):
         })
         
     except Exception as e:
-        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
\ No newline at end of file
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+
+@staff_required
+def chat_api_stats(request):
+    """
+    Staff-only: hit/miss counters of the chatbot answer cache
+    for this worker process.
+    """
+    return JsonResponse(response_cache.stats())
@@ -0,0 +1,64 @@
+import threading
+
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.core.mail import get_connection
+
+# --- Process-wide connection ---
+# Every Celery worker process keeps one email connection open and reuses it
+# for all its reminder emails, instead of logging in to the SMTP server
+# (TLS handshake and all) once per email.
+_connection = None
+_connection_backend = None
+_connection_lock = threading.Lock()
+
+
+def _is_alive(connection):
+    # Only the SMTP backend holds a socket; the others can't go stale
+    smtp = getattr(connection, 'connection', None)
+    if smtp is None:
+        return True
+    try:
+        return smtp.noop()[0] == 250
+    except Exception:
+        return False
+
+
+def get_mail_connection():
+    """
+    Returns this process's open email connection, opening it on first use.
+    It's reopened if the server dropped it while idle or if EMAIL_BACKEND
+    has changed since it was opened.
+    """
+    global _connection, _connection_backend
+    backend = settings.EMAIL_BACKEND
+    with _connection_lock:
+        if _connection is not None and (_connection_backend != backend or not _is_alive(_connection)):
+            _close()
+        if _connection is None:
+            connection = get_connection(backend)
+            connection.open()
+            _connection, _connection_backend = connection, backend
+        return _connection
+
+
+def close_mail_connection():
+    """Closes the connection; the next get_mail_connection() opens a fresh one."""
+    with _connection_lock:
+        _close()
+
+
+def _close():
+    global _connection, _connection_backend
+    connection, _connection, _connection_backend = _connection, None, None
+    if connection is not None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+@worker_process_shutdown.connect
+def _close_on_shutdown(**kwargs):
+    # Say goodbye to the SMTP server properly when the worker stops
+    close_mail_connection()
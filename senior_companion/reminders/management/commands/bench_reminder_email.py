@@ -0,0 +1,112 @@
+import contextlib
+import io
+import socket
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from reminders.mail_connection import close_mail_connection
+from reminders.models import Medication, Reminder
+from reminders.tasks import build_reminder_email, send_reminders
+
+User = get_user_model()
+
+
+class _CountingHandler:
+    """aiosmtpd handler that accepts every message and counts it."""
+
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return '250 Message accepted for delivery'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks reminder email delivery against a local aiosmtpd server: '
+        'one send_mail() (and so one SMTP connection) per email, as before, '
+        'vs. send_reminders() over the pooled connection. '
+        'Needs aiosmtpd (in requirements.txt).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--emails', type=int, default=1000,
+                            help='Reminder emails to send with each method.')
+
+    def handle(self, *args, **options):
+        try:
+            from aiosmtpd.controller import Controller
+        except ImportError:
+            raise CommandError('This benchmark needs aiosmtpd: pip install -r requirements.txt')
+
+        if options['emails'] < 1:
+            raise CommandError('--emails must be at least 1')
+
+        handler = _CountingHandler()
+        controller = Controller(handler, hostname='127.0.0.1', port=self._free_port())
+        controller.start()
+        try:
+            smtp_settings = override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                EMAIL_HOST=controller.hostname,
+                EMAIL_PORT=controller.port,
+                EMAIL_HOST_USER='',
+                EMAIL_HOST_PASSWORD='',
+                EMAIL_USE_TLS=False,
+                EMAIL_USE_SSL=False,
+            )
+            with smtp_settings:
+                reminders = self._make_reminders(options['emails'])
+                self.stdout.write(f"{'method':<28} {'emails':>7} {'time':>9} {'emails/sec':>11}")
+                self._report('send_mail per email', handler, lambda: self._send_one_by_one(reminders))
+                self._report('pooled connection', handler, lambda: self._send_pooled(reminders))
+        finally:
+            close_mail_connection()
+            controller.stop()
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete.'))
+
+    def _free_port(self):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            return s.getsockname()[1]
+
+    def _make_reminders(self, count):
+        """Unsaved reminders; building the emails doesn't need the database."""
+        reminders = []
+        for i in range(count):
+            user = User(username=f'bench_{i}', email=f'bench_{i}@example.com')
+            medication = Medication(user=user, name='Benchmark pill', dosage='1 tablet')
+            reminders.append(Reminder(medication=medication))
+        return reminders
+
+    def _send_one_by_one(self, reminders):
+        # What reminders used to do: send_mail() connects, logs in and
+        # disconnects for every single email
+        for reminder in reminders:
+            message = build_reminder_email(reminder)
+            send_mail(message.subject, message.body, message.from_email, message.to, fail_silently=False)
+
+    def _send_pooled(self, reminders):
+        close_mail_connection()  # Include opening the connection in the timing
+        sent, failed = send_reminders(reminders)
+        if failed:
+            raise CommandError(f'{len(failed)} emails failed to send.')
+
+    def _report(self, label, handler, send):
+        handler.received = 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            send()
+            elapsed = time.perf_counter() - start
+
+        # aiosmtpd counts a message once it has replied to DATA,
+        # which is before our send returns, so this is exact
+        self.stdout.write(
+            f"{label:<28} {handler.received:>7} {elapsed * 1000:>7.0f}ms {handler.received / elapsed:>11.0f}"
+        )
@@ -0,0 +1,131 @@
+import contextlib
+import datetime
+import io
+import random
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from reminders.models import Medication, Reminder, SchedulerWatermark
+from senior_companion_project.celery import app
+from reminders.tasks import REMINDER_WATERMARK, check_reminders
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the reminder tick: for each reminder count, adds that many '
+        'reminders at random times (rolled back afterwards) and times the '
+        'due-reminder lookup (old hour/minute filter vs. minute_of_day index) '
+        'and a full check_reminders run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counts', default='1000,10000,100000',
+                            help='Comma-separated reminder counts to test.')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Times to repeat each lookup (the median is reported).')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            counts = [int(count) for count in options['counts'].split(',')]
+        except ValueError:
+            raise CommandError('--counts must be comma-separated numbers, e.g. 1000,10000')
+
+        rng = random.Random(options['seed'])
+        self.stdout.write(f"{'reminders':>10} {'due':>6} {'hour/minute':>12} {'minute_of_day':>14} {'full tick':>10} {'queries':>8}")
+
+        for count in counts:
+            with transaction.atomic():
+                try:
+                    stats = self._bench(rng, count, options['repeat'])
+                finally:
+                    # Never keep the synthetic reminders
+                    transaction.set_rollback(True)
+
+            self.stdout.write(
+                f"{count:>10} {stats['due']:>6} {stats['old_ms']:>10.2f}ms {stats['new_ms']:>12.2f}ms "
+                f"{stats['tick_ms']:>8.1f}ms {stats['queries']:>8}"
+            )
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete.'))
+
+    def _create_reminders(self, rng, count):
+        """Spreads `count` reminders over ~count/50 users, at random minutes."""
+        tag = uuid.uuid4().hex[:8]
+        owners = max(1, count // 50)
+        User.objects.bulk_create([
+            User(username=f'tick_{tag}_{i}', email=f'tick_{tag}_{i}@example.com', password='!')
+            for i in range(owners)
+        ], batch_size=1000)
+        users = User.objects.filter(username__startswith=f'tick_{tag}_')
+        Medication.objects.bulk_create([
+            Medication(user=user, name='Benchmark pill', dosage='1 tablet') for user in users
+        ], batch_size=1000)
+        medication_ids = list(Medication.objects.filter(user__username__startswith=f'tick_{tag}_').values_list('id', flat=True))
+
+        reminders = []
+        for i in range(count):
+            minute = rng.randrange(24 * 60)
+            reminders.append(Reminder(
+                medication_id=medication_ids[i % len(medication_ids)],
+                reminder_time=datetime.time(minute // 60, minute % 60),
+                # bulk_create() skips save(), so fill the bucket in ourselves
+                minute_of_day=minute,
+            ))
+        Reminder.objects.bulk_create(reminders, batch_size=5000)
+
+    def _median_ms(self, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return timings[len(timings) // 2]
+
+    def _bench(self, rng, count, repeat):
+        self._create_reminders(rng, count)
+
+        now = timezone.localtime(timezone.now())
+        today = now.date()
+        old = Reminder.objects.filter(
+            reminder_time__hour=now.hour,
+            reminder_time__minute=now.minute,
+        ).exclude(last_sent=today)
+        new = Reminder.objects.filter(
+            minute_of_day=Reminder.minute_bucket(now),
+        ).exclude(last_sent=today)
+
+        stats = {
+            'due': new.count(),
+            'old_ms': self._median_ms(old, repeat),
+            'new_ms': self._median_ms(new, repeat),
+        }
+
+        # One real tick covering just this minute (as if the previous one
+        # ran on time), with emails going to memory and its prints silenced.
+        # The delivery tasks run in-process so they're included in the timing.
+        SchedulerWatermark.objects.update_or_create(
+            name=REMINDER_WATERMARK,
+            defaults={'last_tick': now.replace(second=0, microsecond=0) - datetime.timedelta(minutes=1)},
+        )
+        always_eager = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+        try:
+            with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+                with CaptureQueriesContext(connection) as captured, contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    check_reminders()
+                    stats['tick_ms'] = (time.perf_counter() - start) * 1000
+        finally:
+            app.conf.task_always_eager = always_eager
+        stats['queries'] = len(captured.captured_queries)
+        return stats
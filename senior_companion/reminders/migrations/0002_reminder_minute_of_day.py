@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:35
+
+from django.db import migrations, models
+from django.db.models.functions import ExtractHour, ExtractMinute
+
+
+def fill_minute_of_day(apps, schema_editor):
+    # One UPDATE for the whole table, however many reminders there are
+    Reminder = apps.get_model('reminders', 'Reminder')
+    Reminder.objects.update(
+        minute_of_day=ExtractHour('reminder_time') * 60 + ExtractMinute('reminder_time')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reminders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminder',
+            name='minute_of_day',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(fill_minute_of_day, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reminders', '0002_reminder_minute_of_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('last_tick', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reminders', '0003_schedulerwatermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminder',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -31,7 +31,43 @@ class Reminder(models.Model):
     )
     # We only store the time, as this is a daily reminder
     reminder_time = models.TimeField()
+    # reminder_time as minutes since midnight (8:30 AM -> 510), kept in step
+    # by save(). The reminder check looks up one bucket through this index
+    # instead of filtering on the hour and minute of every row.
+    # (bulk_create()/update() skip save(), so set it yourself there.)
+    minute_of_day = models.PositiveSmallIntegerField(db_index=True, editable=False, default=0)
     last_sent = models.DateField(null=True, blank=True, help_text="The date this reminder was last sent.")
+    # Set while a reminder is queued or being sent, cleared once it's sent.
+    # A claim older than REMINDER_CLAIM_LEASE_MINUTES was abandoned (the
+    # worker died, or the delivery ran out of retries), and the next
+    # reminder check queues the reminder again.
+    claimed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    @staticmethod
+    def minute_bucket(value):
+        """The minute_of_day bucket for a time (or datetime)."""
+        return value.hour * 60 + value.minute
+
+    def save(self, *args, **kwargs):
+        # Accept '08:30' as create() always has, not just a time object
+        self.reminder_time = self._meta.get_field('reminder_time').to_python(self.reminder_time)
+        self.minute_of_day = self.minute_bucket(self.reminder_time)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'reminder_time' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'minute_of_day'}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Take {self.medication.name} at {self.reminder_time.strftime('%I:%M %p')}"
+
+class SchedulerWatermark(models.Model):
+    """
+    The last minute a periodic task has fully handled, e.g. for
+    'check_reminders'. The next run picks up from here, so minutes
+    missed while the worker was down (or a tick ran long) aren't lost.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    last_tick = models.DateTimeField()
 
     def __str__(self):
-        return f"Take {self.medication.name} at {self.reminder_time.strftime('%I:%M %p')}"
\ No newline at end of file
+        return f"{self.name} @ {self.last_tick}"
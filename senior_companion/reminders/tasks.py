@@ -1,10 +1,15 @@
-from celery import shared_task
-from .models import Reminder
+from celery import group, shared_task
+from .models import Reminder, SchedulerWatermark
 import datetime
+import smtplib
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, send_mail
 from resources.models import UserInsurancePolicy # <-- Add this import
 from datetime import timedelta
+from .mail_connection import close_mail_connection, get_mail_connection
 # @shared_task
 # def check_reminders():
 #     """
@@ -56,47 +61,127 @@ from datetime import timedelta
 
 #     print("--- Reminder Check Complete ---")
 
-@shared_task
-def check_reminders():
+# The watermark row check_reminders keeps its progress in
+REMINDER_WATERMARK = 'check_reminders'
+
+
+def claim_reminder_window(now):
     """
-    This background task runs every minute, finds due reminders,
-    and sends an email to the user.
+    Works out which minutes this run should check: everything after the
+    last run's watermark up to and including `now` (but no further back
+    than REMINDER_CATCH_UP_MINUTES). Moves the watermark to `now` first,
+    so an overlapping run can't claim the same minutes.
+
+    Returns (start, now) - start itself was already handled - or None if
+    there's nothing to do.
     """
-    
-    # Get the current local time (respecting our TIME_ZONE setting)
-    current_local_time = timezone.localtime(timezone.now())
-    current_time = current_local_time.time()
-    today = current_local_time.date()
+    watermark, created = SchedulerWatermark.objects.get_or_create(
+        name=REMINDER_WATERMARK,
+        defaults={'last_tick': now - timedelta(minutes=1)},
+    )
+    start = timezone.localtime(watermark.last_tick)
+    if start >= now:
+        return None
 
-    print(f"--- Running Reminder Check at {current_local_time.strftime('%Y-%m-%d %I:%M %p')} ---")
+    # Compare-and-set: if another run moved the watermark since we read
+    # it, those minutes are theirs
+    claimed = SchedulerWatermark.objects.filter(
+        pk=watermark.pk, last_tick=watermark.last_tick
+    ).update(last_tick=now)
+    if not claimed:
+        return None
 
-    # Find reminders that are due
-    reminders_due = Reminder.objects.filter(
-        reminder_time__hour=current_time.hour,
-        reminder_time__minute=current_time.minute,
-    ).exclude(
-        last_sent=today
-    )
+    oldest = now - timedelta(minutes=getattr(settings, 'REMINDER_CATCH_UP_MINUTES', 60))
+    if start < oldest:
+        print(f"!!! Reminder checks were missed since {start.strftime('%Y-%m-%d %I:%M %p')}; "
+              f"only catching up from {oldest.strftime('%I:%M %p')} !!!")
+        start = oldest
+    return start, now
 
-    if not reminders_due.exists():
-        print("No reminders due right now.")
-        return
 
-    # Loop through all reminders that are due
-    for reminder in reminders_due:
-        # Get the user and medication details
-        user = reminder.medication.user
-        med_name = reminder.medication.name
-        dosage = reminder.medication.dosage
-        
-        # --- As you requested: use username! ---
-        username = user.username  # For the greeting
-        email_address = user.email  # For sending
+def release_reminder_window(start, end):
+    """Gives the minutes back (if nobody has moved on since) so the next run retries them."""
+    SchedulerWatermark.objects.filter(
+        name=REMINDER_WATERMARK, last_tick=end
+    ).update(last_tick=start)
 
-        # Build the email content
-        subject = f"Friendly Reminder: Time for your medication!"
-        
-        message_body = f"""
+
+def due_reminders(start, end):
+    """
+    Reminders due after `start` up to and including `end` (local times)
+    that haven't been sent for that day yet, as (day, queryset) pairs.
+
+    A window across midnight is split into one range per day, because
+    last_sent records which day's dose a reminder was sent for.
+    """
+    first = start + timedelta(minutes=1)
+    day = first.date()
+    while day <= end.date():
+        low = Reminder.minute_bucket(first) if day == first.date() else 0
+        high = Reminder.minute_bucket(end) if day == end.date() else 24 * 60 - 1
+        yield day, Reminder.objects.filter(
+            minute_of_day__range=(low, high),
+        ).filter(unsent_on(day))
+        day += timedelta(days=1)
+
+
+def unsent_on(day):
+    """Reminders that haven't been sent for `day`'s dose yet."""
+    return Q(last_sent__isnull=True) | Q(last_sent__lt=day)
+
+
+def unclaimed(now):
+    """
+    Reminders nobody is queueing or sending right now: never claimed
+    (or sent since), or claimed more than REMINDER_CLAIM_LEASE_MINUTES ago.
+    """
+    lease = timedelta(minutes=getattr(settings, 'REMINDER_CLAIM_LEASE_MINUTES', 10))
+    return Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - lease)
+
+
+def abandoned(now):
+    """Reminders whose claim ran out without them being sent."""
+    lease = timedelta(minutes=getattr(settings, 'REMINDER_CLAIM_LEASE_MINUTES', 10))
+    return Q(claimed_at__lt=now - lease)
+
+
+def take_reminders(reminder_ids, day, claimed_at):
+    """
+    Loads the given reminders that check_reminders claimed at `claimed_at`
+    and are still unsent for `day`, and moves their claim to now. A
+    duplicate of the same chunk then finds nothing left to send instead of
+    emailing everyone again. Rows another task is taking right now are
+    skipped, not waited for. Returns (reminders, when they were taken).
+    """
+    taken_at = timezone.now()
+    with transaction.atomic():
+        reminders = list(Reminder.objects.select_for_update(
+            skip_locked=True, of=('self',),
+        ).filter(
+            id__in=reminder_ids, claimed_at=claimed_at,
+        ).filter(
+            unsent_on(day)
+        ).select_related('medication__user'))  # the email needs both; fetch them in the same query
+        if reminders:
+            Reminder.objects.filter(id__in=[reminder.id for reminder in reminders]).update(claimed_at=taken_at)
+    return reminders, taken_at
+
+
+def build_reminder_email(reminder):
+    """The email for one medication reminder (not sent yet)."""
+    # Get the user and medication details
+    user = reminder.medication.user
+    med_name = reminder.medication.name
+    dosage = reminder.medication.dosage
+    
+    # --- As you requested: use username! ---
+    username = user.username  # For the greeting
+    email_address = user.email  # For sending
+
+    # Build the email content
+    subject = f"Friendly Reminder: Time for your medication!"
+    
+    message_body = f"""
 Hello, {username}!
 This is a friendly reminder to take your medication:
 
@@ -108,28 +193,155 @@ Have a wonderful day!
 - The Senior Companion Team
 """
 
-        try:
-            # Send the email
-            send_mail(
-                subject,
-                message_body,
-                'reminders@senior-companion.com', # From (matches settings.py)
-                [email_address],                  # To
-                fail_silently=False,
-            )
-            
-            # Print a success message in our Celery Worker terminal
-            print(f"!!! SUCCESSFULLY SENT email to {email_address} for {med_name} !!!")
-            
-            # Mark as sent for today
-            reminder.last_sent = today
-            reminder.save()
+    return EmailMessage(
+        subject,
+        message_body,
+        'reminders@senior-companion.com', # From (matches settings.py)
+        [email_address],                  # To
+    )
+
 
+def send_reminders(reminders):
+    """
+    Emails medication reminders over this worker's open SMTP connection,
+    one message at a time, so we always know exactly which ones got out.
+    Returns (sent, failed) lists of reminders; the caller marks them in bulk.
+
+    A failed email doesn't stop the rest: the connection is closed (it may
+    be broken) and the next email goes out on a fresh one. Failed emails
+    are never resent here, only by the task's retry, so nobody gets one
+    twice. If the mail server can't be reached at all, the rest fail too.
+    """
+    sent = []
+    failed = []
+    connection = None
+    for i, reminder in enumerate(reminders):
+        message = build_reminder_email(reminder)
+        try:
+            if connection is None:
+                connection = get_mail_connection()
         except Exception as e:
-            # If the email fails, print the error
-            print(f"!!! FAILED to send email to {email_address}: {e} !!!")
+            print(f"!!! FAILED to connect to the mail server: {e} !!!")
+            failed.extend(reminders[i:])
+            break
+        try:
+            connection.send_messages([message])
+        except Exception as e:
+            # The connection may be broken; start the next email on a new one
+            close_mail_connection()
+            connection = None
+            print(f"!!! FAILED to send email to {message.to[0]}: {e} !!!")
+            failed.append(reminder)
+            continue
+
+        # Print a success message in our Celery Worker terminal
+        print(f"!!! SUCCESSFULLY SENT email to {message.to[0]} for {reminder.medication.name} !!!")
+        sent.append(reminder)
+    return sent, failed
+
+
+class ReminderDeliveryError(Exception):
+    """Some emails in a deliver_reminders chunk failed (Celery retries the chunk)."""
+
+
+@shared_task(
+    autoretry_for=(Exception,),
+    retry_backoff=True,      # wait ~1s, 2s, 4s... between tries
+    retry_backoff_max=300,
+    retry_jitter=True,
+    max_retries=5,
+)
+def deliver_reminders(reminder_ids, day, claimed_at):
+    """
+    Emails one chunk of due reminders (queued by check_reminders) and marks
+    them sent for `day` (an ISO date string). `claimed_at` (ISO datetime)
+    is the claim check_reminders put on them: only reminders still under
+    that claim are sent, so running the same chunk twice sends each email
+    once. Failed ones go back under the same claim, so a retry only
+    re-sends those. If this task dies, or runs out of retries, the claim
+    runs out and a later reminder check queues them again.
+    """
+    day = datetime.date.fromisoformat(day)
+    claimed_at = datetime.datetime.fromisoformat(claimed_at)
+    reminders, taken_at = take_reminders(reminder_ids, day, claimed_at)
+
+    sent, failed = send_reminders(reminders)
+    sent = [reminder.id for reminder in sent]
+    failed = [reminder.id for reminder in failed]
+
+    # One UPDATE for the chunk's sent reminders, one for its failures
+    if sent:
+        Reminder.objects.filter(id__in=sent, claimed_at=taken_at).update(last_sent=day, claimed_at=None)
+    if failed:
+        Reminder.objects.filter(id__in=failed, claimed_at=taken_at).update(claimed_at=claimed_at)
+        raise ReminderDeliveryError(f"{len(failed)} of {len(reminders)} reminder emails failed")
+    return len(sent)
+
+
+@shared_task
+def check_reminders():
+    """
+    This background task runs every minute and finds due reminders.
+    It doesn't send anything itself: the reminders are split into chunks
+    of REMINDER_DELIVERY_CHUNK_SIZE and each chunk is queued as a
+    deliver_reminders task, so a busy minute (8:00 AM!) is spread over
+    all the worker processes instead of one task sending every email.
+
+    It checks every minute since the last successful run, not just the
+    current one, so reminders aren't lost when the worker was down or a
+    run overran. Queued reminders are claimed (claimed_at), and whatever
+    is still unsent when its claim runs out (a worker died, or the
+    delivery ran out of retries during an SMTP outage) is queued again,
+    as long as it's within REMINDER_CATCH_UP_MINUTES. The claims and
+    last_sent keep it from sending anything twice.
+    """
+    
+    # Get the current local time (respecting our TIME_ZONE setting)
+    current_local_time = timezone.localtime(timezone.now()).replace(second=0, microsecond=0)
+
+    print(f"--- Running Reminder Check at {current_local_time.strftime('%Y-%m-%d %I:%M %p')} ---")
+
+    window = claim_reminder_window(current_local_time)
+    if window is None:
+        print("No new minutes to check (already done, or another check is running).")
+        return
+    start, end = window
+
+    chunk_size = getattr(settings, 'REMINDER_DELIVERY_CHUNK_SIZE', 100)
+    claimed_at = timezone.now()
+    due = {}  # day -> reminder IDs
+    deliveries = []
+    try:
+        # Only the IDs here; each delivery task loads its own chunk.
+        # The new minutes, then earlier ones with abandoned claims.
+        for day, reminders_due in due_reminders(start, end):
+            due.setdefault(day, []).extend(reminders_due.filter(unclaimed(claimed_at)).values_list('id', flat=True))
+        oldest = end - timedelta(minutes=getattr(settings, 'REMINDER_CATCH_UP_MINUTES', 60))
+        if start > oldest:
+            for day, reminders_due in due_reminders(oldest, start):
+                due.setdefault(day, []).extend(reminders_due.filter(abandoned(claimed_at)).values_list('id', flat=True))
+
+        all_ids = [reminder_id for ids in due.values() for reminder_id in ids]
+        if all_ids:
+            # Only the ones still unclaimed: if an overlapping check's sweep
+            # got there first, our chunk finds them gone and skips them
+            Reminder.objects.filter(id__in=all_ids).filter(unclaimed(claimed_at)).update(claimed_at=claimed_at)
+        for day, ids in due.items():
+            for i in range(0, len(ids), chunk_size):
+                deliveries.append(deliver_reminders.s(ids[i:i + chunk_size], day.isoformat(), claimed_at.isoformat()))
+
+        if deliveries:
+            group(deliveries).apply_async()
+    except Exception:
+        # Something broke (e.g. the database or the broker); let the next
+        # run retry these minutes. Chunks that did get queued find their
+        # claim gone and send nothing, so nobody gets an email twice.
+        Reminder.objects.filter(claimed_at=claimed_at).update(claimed_at=None)
+        release_reminder_window(start, end)
+        raise
+    due_count = len(all_ids)
 
-    print("--- Reminder Check Complete ---")
+    print(f"--- Reminder Check Complete: {due_count} reminders queued in {len(deliveries)} chunks ---")
 # --- END OF REPLACEMENT ---
 
 @shared_task
@@ -184,10 +396,12 @@ Please review your policy or contact your provider to renew it.
                     'reminders@senior-companion.com',
                     [user.email],
                     fail_silently=False,
+                    connection=get_mail_connection(),
                 )
                 print(f"!!! SENT INSURANCE REMINDER to {user.email} for {policy.policy_name} !!!")
                 
             except Exception as e:
+                close_mail_connection()
                 print(f"!!! FAILED to send insurance email: {e} !!!")
 
     print("--- Insurance Check Complete ---")
@@ -1,3 +1,345 @@
 from django.test import TestCase
 
 # Create your tests here.
+import datetime
+import smtplib
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import override_settings
+from django.utils import timezone
+
+from senior_companion_project.celery import app
+from .models import Medication, Reminder, SchedulerWatermark
+from .tasks import (
+    REMINDER_WATERMARK, ReminderDeliveryError, check_reminders, deliver_reminders, take_reminders,
+)
+
+User = get_user_model()
+
+
+class ReminderCheckTestCase(TestCase):
+    """Runs check_reminders at set times on 1 January 2026, with the deliveries in-process."""
+
+    def setUp(self):
+        # Run the queued deliver_reminders tasks in-process, right away
+        always_eager = app.conf.task_always_eager
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', always_eager)
+
+        self.tz = timezone.get_current_timezone()
+        # As if the previous check ran on time at 08:29
+        SchedulerWatermark.objects.create(
+            name=REMINDER_WATERMARK,
+            last_tick=datetime.datetime(2026, 1, 1, 8, 29, tzinfo=self.tz),
+        )
+
+    def add_reminders(self, count, at):
+        for i in range(count):
+            user = User.objects.create(username=f'senior{at.hour}{at.minute}_{i}', email=f'senior{at.hour}{at.minute}_{i}@example.com')
+            medication = Medication.objects.create(user=user, name=f'Pill {i}', dosage='1 tablet')
+            Reminder.objects.create(medication=medication, reminder_time=at)
+
+    def set_watermark(self, hour, minute, day=1):
+        SchedulerWatermark.objects.filter(name=REMINDER_WATERMARK).update(
+            last_tick=datetime.datetime(2026, 1, day, hour, minute, tzinfo=self.tz),
+        )
+
+    def run_check(self, hour, minute, day=1):
+        now = datetime.datetime(2026, 1, day, hour, minute, 5, tzinfo=self.tz)
+        with mock.patch('django.utils.timezone.now', return_value=now), mock.patch('builtins.print'):
+            check_reminders()
+
+    def claim(self, ids):
+        """Claims the reminders the way check_reminders does; returns the claim for deliver_reminders."""
+        claimed_at = datetime.datetime(2026, 1, 1, 8, 30, 5, tzinfo=self.tz)
+        Reminder.objects.filter(id__in=ids).update(claimed_at=claimed_at)
+        return claimed_at.isoformat()
+
+
+class CheckRemindersQueryCountTests(ReminderCheckTestCase):
+    """check_reminders should cost the same number of queries however many reminders are due."""
+    def test_query_count_does_not_grow_with_due_reminders(self):
+        self.add_reminders(1, datetime.time(8, 30))
+        self.add_reminders(25, datetime.time(8, 31))
+
+        # Read the watermark, move it, fetch the due IDs and any abandoned
+        # earlier ones, claim them; then the delivery task fetches them (with
+        # their medication and user joined in) and takes them in one
+        # transaction (+2 for its savepoint here), and marks them sent
+        with self.assertNumQueries(10):
+            self.run_check(8, 30)
+        self.assertEqual(len(mail.outbox), 1)
+
+        # 25 due must take exactly as many
+        mail.outbox.clear()
+        with self.assertNumQueries(10):
+            self.run_check(8, 31)
+        self.assertEqual(len(mail.outbox), 25)
+
+        self.assertFalse(Reminder.objects.filter(last_sent__isnull=True).exists())
+        self.assertEqual(
+            set(Reminder.objects.values_list('last_sent', flat=True)),
+            {datetime.date(2026, 1, 1)},
+        )
+
+    @override_settings(REMINDER_DELIVERY_CHUNK_SIZE=10)
+    def test_due_reminders_are_delivered_in_chunks(self):
+        self.add_reminders(25, datetime.time(8, 30))
+
+        # Three chunks (10 + 10 + 5): two queries each in a savepoint, then
+        # the one marking them sent
+        with self.assertNumQueries(5 + 3 * 5):
+            self.run_check(8, 30)
+        self.assertEqual(len(mail.outbox), 25)
+        self.assertFalse(Reminder.objects.filter(last_sent__isnull=True).exists())
+
+    def test_failed_email_is_retried_without_resending_the_rest(self):
+        self.add_reminders(25, datetime.time(8, 30))
+
+        send_messages = EmailBackend.send_messages
+        calls = []
+
+        def flaky_send_messages(backend, messages):
+            calls.append(messages[0].to[0])
+            if len(calls) == 12:
+                raise smtplib.SMTPDataError(451, 'Temporary local problem')
+            return send_messages(backend, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', flaky_send_messages):
+            self.run_check(8, 30)
+
+        # One email at a time: the 12th failed and the rest went out anyway;
+        # then the retry sent only the failed one
+        self.assertEqual(len(calls), 26)
+        self.assertEqual(calls[-1], calls[11])
+        self.assertEqual(len(mail.outbox), 25)
+        self.assertFalse(Reminder.objects.filter(last_sent__isnull=True).exists())
+
+    def test_duplicate_chunk_does_not_send_twice(self):
+        self.add_reminders(5, datetime.time(8, 30))
+        ids = list(Reminder.objects.values_list('id', flat=True))
+        claimed_at = self.claim(ids)
+
+        # The same chunk queued twice (queueing the group failed partway
+        # and was retried): the copy runs while the first is still sending
+        send_messages = EmailBackend.send_messages
+        duplicates = []
+
+        def send_with_duplicate_running(backend, messages):
+            if not duplicates:
+                duplicates.append(deliver_reminders(ids, '2026-01-01', claimed_at))
+            return send_messages(backend, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', send_with_duplicate_running), mock.patch('builtins.print'):
+            self.assertEqual(deliver_reminders(ids, '2026-01-01', claimed_at), 5)
+
+        self.assertEqual(duplicates, [0])
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_dropped_connection_only_resends_the_unsent_emails(self):
+        self.add_reminders(5, datetime.time(8, 30))
+        ids = list(Reminder.objects.values_list('id', flat=True))
+        claimed_at = self.claim(ids)
+
+        send_messages = EmailBackend.send_messages
+        calls = []
+
+        def send_until_disconnected(backend, messages):
+            calls.append(len(messages))
+            if len(calls) == 3:
+                # The server goes away after two emails got out
+                raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+            return send_messages(backend, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', send_until_disconnected), mock.patch('builtins.print'):
+            # Called directly, so the failure raises instead of retrying
+            with self.assertRaises(ReminderDeliveryError):
+                deliver_reminders(ids, '2026-01-01', claimed_at)
+            # The rest went out on a new connection; the failed one is
+            # still claimed, and the retry sends just that
+            self.assertEqual(len(mail.outbox), 4)
+            self.assertEqual(deliver_reminders(ids, '2026-01-01', claimed_at), 1)
+
+        self.assertEqual(calls, [1] * 6)
+        recipients = [message.to[0] for message in mail.outbox]
+        self.assertEqual(len(recipients), 5)
+        self.assertEqual(len(set(recipients)), 5)
+        self.assertFalse(Reminder.objects.filter(last_sent__isnull=True).exists())
+
+    @override_settings(REMINDER_CLAIM_LEASE_MINUTES=10)
+    def test_reminder_claimed_by_a_worker_that_died_is_queued_again(self):
+        self.add_reminders(1, datetime.time(8, 30))
+
+        # The chunk is queued, and a worker takes it and dies before sending
+        with mock.patch('celery.group.apply_async'):
+            self.run_check(8, 30)
+        ids = list(Reminder.objects.values_list('id', flat=True))
+        claimed_at = Reminder.objects.get().claimed_at
+        taken_at = datetime.datetime(2026, 1, 1, 8, 30, 10, tzinfo=self.tz)
+        with mock.patch('django.utils.timezone.now', return_value=taken_at):
+            take_reminders(ids, datetime.date(2026, 1, 1), claimed_at)
+        self.assertEqual(len(mail.outbox), 0)
+
+        # Still claimed: it might just be slow
+        self.run_check(8, 35)
+        self.assertEqual(len(mail.outbox), 0)
+
+        # The claim has run out, so it's queued again, once
+        self.run_check(8, 41)
+        self.run_check(8, 42)
+        self.assertEqual(len(mail.outbox), 1)
+        reminder = Reminder.objects.get()
+        self.assertEqual(reminder.last_sent, datetime.date(2026, 1, 1))
+        self.assertIsNone(reminder.claimed_at)
+
+    @override_settings(REMINDER_CLAIM_LEASE_MINUTES=10)
+    def test_reminder_that_ran_out_of_retries_is_queued_again(self):
+        self.add_reminders(1, datetime.time(8, 30))
+
+        calls = []
+
+        def failing_send_messages(backend, messages):
+            calls.append(len(messages))
+            raise smtplib.SMTPDataError(451, 'Temporary local problem')
+
+        with mock.patch.object(EmailBackend, 'send_messages', failing_send_messages):
+            self.run_check(8, 30)
+        # The first try and all five retries failed
+        self.assertEqual(calls, [1] * 6)
+        self.assertIsNotNone(Reminder.objects.get().claimed_at)
+
+        # The mail server is back, but the claim hasn't run out yet
+        self.run_check(8, 35)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.run_check(8, 41)
+        self.run_check(8, 42)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(Reminder.objects.get().last_sent, datetime.date(2026, 1, 1))
+
+class CheckRemindersCatchUpTests(ReminderCheckTestCase):
+    """check_reminders sends everything due since the last check, once."""
+
+    def sent_times(self):
+        return sorted(
+            (reminder.reminder_time, reminder.last_sent)
+            for reminder in Reminder.objects.filter(last_sent__isnull=False)
+        )
+
+    def test_next_check_sends_the_minutes_since_the_last_one(self):
+        for at in (datetime.time(8, 30), datetime.time(8, 33), datetime.time(8, 35), datetime.time(8, 36)):
+            self.add_reminders(1, at)
+
+        self.run_check(8, 30)
+        self.assertEqual(len(mail.outbox), 1)
+
+        # The checks at 08:31-08:34 never ran
+        self.run_check(8, 35)
+        self.assertEqual(len(mail.outbox), 3)
+        day = datetime.date(2026, 1, 1)
+        self.assertEqual(self.sent_times(), [
+            (datetime.time(8, 30), day), (datetime.time(8, 33), day), (datetime.time(8, 35), day),
+        ])
+
+    def test_repeat_check_sends_nothing(self):
+        self.add_reminders(2, datetime.time(8, 30))
+
+        self.run_check(8, 30)
+        self.run_check(8, 30)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_overlapping_check_leaves_the_minutes_to_the_one_that_moved_the_watermark(self):
+        self.add_reminders(2, datetime.time(8, 30))
+
+        get_or_create = SchedulerWatermark.objects.get_or_create
+
+        def read_then_overtaken(**kwargs):
+            # Another check moves the watermark between our read and our update
+            result = get_or_create(**kwargs)
+            self.set_watermark(8, 30)
+            return result
+
+        with mock.patch.object(SchedulerWatermark.objects, 'get_or_create', side_effect=read_then_overtaken):
+            self.run_check(8, 30)
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(Reminder.objects.filter(claimed_at__isnull=False).exists())
+        self.assertEqual(
+            SchedulerWatermark.objects.get(name=REMINDER_WATERMARK).last_tick,
+            datetime.datetime(2026, 1, 1, 8, 30, tzinfo=self.tz),
+        )
+
+    def test_window_across_midnight_sends_each_reminder_for_its_own_day(self):
+        for at in (datetime.time(23, 59), datetime.time(0, 1), datetime.time(0, 3)):
+            self.add_reminders(1, at)
+        self.set_watermark(23, 58)
+
+        self.run_check(0, 2, day=2)
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(self.sent_times(), [
+            (datetime.time(0, 1), datetime.date(2026, 1, 2)),
+            (datetime.time(23, 59), datetime.date(2026, 1, 1)),
+        ])
+
+    @override_settings(REMINDER_CATCH_UP_MINUTES=60)
+    def test_long_gap_only_catches_up_the_last_hour(self):
+        for at in (datetime.time(9, 0), datetime.time(14, 0), datetime.time(14, 30), datetime.time(15, 29)):
+            self.add_reminders(1, at)
+
+        # Nothing ran for seven hours
+        self.run_check(15, 29)
+
+        day = datetime.date(2026, 1, 1)
+        self.assertEqual(self.sent_times(), [(datetime.time(14, 30), day), (datetime.time(15, 29), day)])
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_failed_enqueue_gives_the_minutes_back(self):
+        self.add_reminders(2, datetime.time(8, 30))
+
+        with mock.patch('celery.group.apply_async', side_effect=ConnectionError('broker is down')):
+            with self.assertRaises(ConnectionError):
+                self.run_check(8, 30)
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            SchedulerWatermark.objects.get(name=REMINDER_WATERMARK).last_tick,
+            datetime.datetime(2026, 1, 1, 8, 29, tzinfo=self.tz),
+        )
+        self.assertFalse(Reminder.objects.filter(claimed_at__isnull=False).exists())
+
+        # The next check picks them up
+        self.run_check(8, 31)
+        self.assertEqual(len(mail.outbox), 2)
+
+
+class ReminderMinuteOfDayTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create(username='senior', email='senior@example.com')
+        self.medication = Medication.objects.create(user=user, name='Vitamin D', dosage='1 tablet')
+
+    def test_minute_of_day_follows_reminder_time(self):
+        reminder = Reminder.objects.create(medication=self.medication, reminder_time=datetime.time(8, 30))
+        self.assertEqual(reminder.minute_of_day, 8 * 60 + 30)
+
+        reminder.reminder_time = datetime.time(20, 15)
+        reminder.save()
+        reminder.refresh_from_db()
+        self.assertEqual(reminder.minute_of_day, 20 * 60 + 15)
+
+    def test_reminder_time_may_be_a_string(self):
+        reminder = Reminder.objects.create(medication=self.medication, reminder_time='08:30')
+        self.assertEqual(reminder.reminder_time, datetime.time(8, 30))
+        reminder.refresh_from_db()
+        self.assertEqual(reminder.minute_of_day, 8 * 60 + 30)
+
+    def test_update_fields_saves_minute_of_day_too(self):
+        reminder = Reminder.objects.create(medication=self.medication, reminder_time=datetime.time(8, 30))
+        reminder.reminder_time = '21:05'
+        reminder.save(update_fields=['reminder_time'])
+        reminder.refresh_from_db()
+        self.assertEqual((reminder.reminder_time, reminder.minute_of_day), (datetime.time(21, 5), 21 * 60 + 5))
@@ -67,6 +67,12 @@ def home(request):
         except AttributeError:
             # This handles a rare case where a profile might not exist yet
             pass 
+
+        # Unread chat badges: one query on the counter table,
+        # no counting of messages
+        context['unread_chats'] = request.user.unread_counters.filter(
+            count__gt=0
+        ).select_related('last_sender').order_by('-updated_at')
             
     return render(request, 'resources/home.html', context)
 
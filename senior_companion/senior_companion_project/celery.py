@@ -35,4 +35,13 @@ def setup_periodic_tasks(sender, **kwargs):
         60.0,  # Run every 60 seconds
         'reminders.tasks.check_reminders',
         name='check reminders every minute'
+    )
+
+    # One email per user for chat messages that arrived while they were
+    # offline, batched over this window (CHAT_DIGEST_INTERVAL seconds)
+    from django.conf import settings
+    sender.add_periodic_task(
+        getattr(settings, 'CHAT_DIGEST_INTERVAL', 600),
+        'chat.tasks.send_chat_digests',
+        name='send chat digests'
     )
\ No newline at end of file
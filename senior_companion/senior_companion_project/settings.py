@@ -177,16 +177,152 @@ LOGOUT_REDIRECT_URL = 'home'
 # This tells Django to use Channels as the main web server (ASGI)
 ASGI_APPLICATION = 'senior_companion_project.asgi.application'
 
-# This configures the "Channel Layer" to use Redis
-# It will connect to the redis-server you have running.
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            "hosts": [('127.0.0.1', 6380)],
+# Which "Channel Layer" to use, picked with the CHAT_CHANNEL_LAYER env var:
+#   'redis'  - channels_redis (the default). It connects to the redis-server(s)
+#              listed in CHAT_REDIS_HOSTS (comma-separated URLs). With more
+#              than one host, channels_redis shards by consistent hashing:
+#              each group (group_chat_1_2, ...) and channel always lives on
+#              the same host, so rooms spread across the servers.
+#   'memory' - in-process layer. No Redis needed, but messages only reach
+#              consumers in the same process: single-node setups and tests.
+CHAT_CHANNEL_LAYER = os.getenv('CHAT_CHANNEL_LAYER', 'redis')
+CHAT_REDIS_HOSTS = [
+    host.strip()
+    for host in os.getenv('CHAT_REDIS_HOSTS', 'redis://127.0.0.1:6380').split(',')
+    if host.strip()
+]
+
+if CHAT_CHANNEL_LAYER == 'memory':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
         },
-    },
-}
+    }
+elif CHAT_CHANNEL_LAYER == 'redis':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                "hosts": CHAT_REDIS_HOSTS,
+            },
+        },
+    }
+else:
+    raise ValueError(f"CHAT_CHANNEL_LAYER must be 'redis' or 'memory', not {CHAT_CHANNEL_LAYER!r}")
+
+
+# --- CHATBOT CONFIGURATION ---
+# The chatbot keeps a compiled copy of all LogicRules in memory.
+# It is rebuilt when a rule changes (via signals) and, as a safety net
+# for multi-worker setups, at least this often (in seconds).
+CHATBOT_RULE_INDEX_MAX_AGE = 300
+
+# How a 'contains' keyword must line up with the words of a message:
+# 'substring' (anywhere), 'prefix' (start of a word) or 'word' (whole word).
+CHATBOT_CONTAINS_BOUNDARY = 'substring'
+
+# Time budget (seconds) for all regex rules on one message. A regex rule
+# that alone takes longer is disabled and flagged in the admin, once it
+# has happened this many times within this many seconds.
+CHATBOT_REGEX_TIME_BUDGET = 0.05
+CHATBOT_REGEX_SLOW_STRIKES = 3
+CHATBOT_REGEX_SLOW_WINDOW = 600
+
+# How long a new regex pattern may take on adversarial test input
+# before the admin form rejects it.
+CHATBOT_REGEX_PROBE_TIMEOUT = 1.0
+
+# Most typos the chatbot forgives in a long keyword ("hospitel" -> "hospital").
+# Keywords under 5 letters must be spelled right; 5-7 letters allow 1 typo.
+CHATBOT_FUZZY_MAX_DISTANCE = 2
+
+# TF-IDF fallback index, built with 'python manage.py build_chatbot_index'.
+CHATBOT_SEMANTIC_INDEX_DIR = BASE_DIR / 'ml_models' / 'chatbot_tfidf'
+# Minimum cosine similarity (0-1) before the bot trusts a TF-IDF match.
+CHATBOT_SEMANTIC_THRESHOLD = 0.35
+
+# Answers to recently asked questions are cached (LRU, per worker process).
+CHATBOT_RESPONSE_CACHE_SIZE = 1000
+# To share the cache between workers, point this at a cache in CACHES, e.g.
+# CACHES = {
+#     'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+#     'chatbot': {
+#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'LOCATION': 'redis://127.0.0.1:6380/1',
+#     },
+# }
+# CHATBOT_RESPONSE_CACHE_ALIAS = 'chatbot'
+CHATBOT_RESPONSE_CACHE_ALIAS = None
+
+# Limits for the chatbot widget's WebSocket (per connection):
+# longest question accepted, and how many questions per time window.
+CHATBOT_WS_MAX_MESSAGE_LENGTH = 500
+CHATBOT_WS_MAX_MESSAGES = 20
+CHATBOT_WS_WINDOW = 10  # seconds
+
+# Questions the bot can't answer are saved in batches in the background.
+# A batch is written when it reaches this many questions...
+CHATBOT_UNANSWERED_BATCH_SIZE = 50
+# ...or after this many seconds, whichever comes first.
+CHATBOT_UNANSWERED_FLUSH_INTERVAL = 5.0
+# Repeats of the same question within this many seconds only bump its counter.
+CHATBOT_UNANSWERED_DEDUP_WINDOW = 3600
+
+
+# --- CHAT CONFIGURATION ---
+# Chat messages are saved in batches: when this many are waiting...
+CHAT_MESSAGE_BATCH_SIZE = 100
+# ...or this many seconds after the first unsaved one, whichever comes first.
+CHAT_MESSAGE_FLUSH_INTERVAL = 0.5
+# A batch that fails to save is retried (after 1s, 2s, 4s... at the default
+# interval) this many times before it's dropped and logged as an error.
+CHAT_MESSAGE_MAX_RETRIES = 3
+# Messages sent on connect, and per "load older" request.
+CHAT_HISTORY_PAGE_SIZE = 50
+# A few seconds after connecting, messages that were still waiting in
+# another worker's write buffer when history was loaded are sent on.
+CHAT_HISTORY_CATCH_UP_DELAY = 2.0
+# "Still typing" updates are passed on at most this often (in seconds)
+# per connection, however many keystrokes the browser reports.
+CHAT_TYPING_INTERVAL = 1.0
+# Every connection tells its room it's still there this often (in seconds).
+# Someone not heard from for CHAT_PRESENCE_TTL seconds (their worker died,
+# say) is shown as offline and gets email digests again.
+CHAT_PRESENCE_HEARTBEAT = 30
+CHAT_PRESENCE_TTL = 90
+
+# Flood protection for chat sockets. Frames bigger than this are dropped
+# before they are parsed, and chat messages longer than this are refused.
+CHAT_MAX_FRAME_BYTES = 4096
+CHAT_MAX_MESSAGE_LENGTH = 2000
+# Token buckets: every frame on a connection, and every chat message a
+# user sends (across all their tabs), may come at this many per second
+# on average, with bursts of up to _BURST.
+CHAT_CONNECTION_RATE = 5
+CHAT_CONNECTION_BURST = 20
+CHAT_USER_RATE = 5
+CHAT_USER_BURST = 20
+# After this many refused frames the socket is closed (code 4008). The count
+# starts again once a connection goes this many seconds without one.
+CHAT_MAX_VIOLATIONS = 20
+CHAT_VIOLATION_WINDOW = 60
+# Messages sent to someone who isn't connected are emailed to them as
+# one digest per this many seconds, instead of one email per message.
+CHAT_DIGEST_INTERVAL = 600
+
+
+# --- REMINDERS CONFIGURATION ---
+# If reminder checks were missed (worker down, a slow run), the next check
+# sends what was due since the last one, going back at most this many minutes.
+REMINDER_CATCH_UP_MINUTES = 60
+# Due reminders are emailed by deliver_reminders tasks, this many per task,
+# so a busy minute is shared out across all the Celery worker processes.
+REMINDER_DELIVERY_CHUNK_SIZE = 100
+# Queued reminders are claimed while they're being sent. One still unsent
+# this many minutes after it was claimed (its worker died, or the delivery
+# ran out of retries) is queued again by the next check. Keep it well
+# above the time a delivery takes with all its retries.
+REMINDER_CLAIM_LEASE_MINUTES = 10
 
 
 # --- Celery Configuration ---